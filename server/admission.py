@@ -0,0 +1,370 @@
+# admission.py
+import asyncio
+import functools
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+import torch
+from transformers import StoppingCriteria
+
+# ----------------------
+# Configuration
+# ----------------------
+# Per-endpoint "concurrency:queue" limits, e.g. ADMISSION_DOCUMENT=1:8
+ADMISSION_DEFAULTS = {
+    "translate": (1, 64),
+    "bulk": (1, 2),
+    "document": (1, 8),
+}
+# Longest a request may wait for a slot before it is shed with 503
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "30"))
+# Default per-endpoint deadlines in seconds (queue wait included), e.g.
+# REQUEST_DEADLINE_TRANSLATE=60. Clients may ask for less with X-Request-Timeout.
+REQUEST_DEADLINE_DEFAULTS = {
+    "translate": 60.0,
+    "bulk": 3600.0,
+    "document": 900.0,
+}
+# Minimum seconds between two client-disconnect probes of the same request
+DISCONNECT_POLL_INTERVAL = 0.5
+
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+log = logging.getLogger("admission")
+
+
+class RequestCancelled(Exception):
+    """Raised inside request work once its deadline passed or the client went away."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"request cancelled: {reason}")
+        self.reason = reason
+
+
+class CancelToken:
+    """Deadline plus client-disconnect detection for one request."""
+
+    def __init__(self, deadline: float, sock: Optional[socket.socket] = None):
+        self.deadline = deadline
+        self._sock = sock
+        self._last_poll = 0.0
+        self.reason: Optional[str] = None
+
+    def cancelled(self) -> bool:
+        if self.reason is not None:
+            return True
+        now = time.monotonic()
+        if now >= self.deadline:
+            self.reason = "deadline"
+        elif (
+            self._sock is not None and now - self._last_poll >= DISCONNECT_POLL_INTERVAL
+        ):
+            self._last_poll = now
+            if _peer_closed(self._sock):
+                self.reason = "disconnected"
+        return self.reason is not None
+
+    def cancel(self, reason: str):
+        if self.reason is None:
+            self.reason = reason
+
+    def raise_if_cancelled(self):
+        if self.cancelled():
+            raise RequestCancelled(self.reason)
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+
+def _peer_closed(sock: socket.socket) -> bool:
+    """True if the client closed its end (a peek at the socket reads EOF)."""
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+    except (BlockingIOError, InterruptedError):
+        return False
+    except OSError:
+        return True
+
+
+_local = threading.local()
+
+
+def current_token() -> Optional[CancelToken]:
+    return getattr(_local, "token", None)
+
+
+def set_token(token: Optional[CancelToken]):
+    """Bind a token to the current thread (used by worker processes)."""
+    _local.token = token
+
+
+def raise_if_cancelled():
+    """Cooperative cancellation point for code running on behalf of a request."""
+    token = current_token()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+class AdmissionQueue:
+    """
+    Bounded admission for one endpoint: at most `concurrency` requests run and at
+    most `max_queued` wait. Anything beyond that is shed immediately.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queued: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queued = max(0, max_queued)
+        self._cond = threading.Condition()
+        self.active = 0
+        self.queued = 0
+        # Moving average of service time, used for Retry-After
+        self._avg_service = 1.0
+        self.counts = Counter()
+
+    def acquire(self, timeout: float) -> Optional[str]:
+        """Take a slot; returns None on success or the reason the request was shed."""
+        with self._cond:
+            if self.active < self.concurrency:
+                self.active += 1
+                return None
+            if self.queued >= self.max_queued:
+                self.counts["shed_queue_full"] += 1
+                return "queue_full"
+            self.queued += 1
+            try:
+                end = time.monotonic() + timeout
+                while self.active >= self.concurrency:
+                    remaining = end - time.monotonic()
+                    if remaining <= 0:
+                        self.counts["shed_queue_timeout"] += 1
+                        return "queue_timeout"
+                    self._cond.wait(remaining)
+                self.active += 1
+                return None
+            finally:
+                self.queued -= 1
+
+    def release(self, service_seconds: float):
+        with self._cond:
+            self.active -= 1
+            self._avg_service = 0.8 * self._avg_service + 0.2 * service_seconds
+            self._cond.notify()
+
+    def retry_after(self) -> int:
+        backlog = (self.queued + self.active) / self.concurrency
+        return max(1, math.ceil(self._avg_service * backlog))
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "concurrency": self.concurrency,
+                "max_queued": self.max_queued,
+                "active": self.active,
+                "queued": self.queued,
+                "avg_service_seconds": round(self._avg_service, 3),
+                **self.counts,
+            }
+
+
+class AsyncAdmissionQueue(AdmissionQueue):
+    """AdmissionQueue for asyncio front ends: waiting requests hold no thread."""
+
+    def __init__(self, name: str, concurrency: int, max_queued: int):
+        super().__init__(name, concurrency, max_queued)
+        self._sem = asyncio.Semaphore(self.concurrency)
+
+    async def acquire(self, timeout: float) -> Optional[str]:
+        # Counted synchronously: other coroutines may run before the semaphore is taken
+        if self.active + self.queued >= self.concurrency + self.max_queued:
+            self.counts["shed_queue_full"] += 1
+            return "queue_full"
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), max(0.0, timeout))
+        except asyncio.TimeoutError:
+            self.counts["shed_queue_timeout"] += 1
+            return "queue_timeout"
+        finally:
+            self.queued -= 1
+        self.active += 1
+        return None
+
+    def release(self, service_seconds: float):
+        self.active -= 1
+        self._avg_service = 0.8 * self._avg_service + 0.2 * service_seconds
+        self._sem.release()
+
+
+def _limits(name: str):
+    concurrency, max_queued = ADMISSION_DEFAULTS.get(name, (1, 8))
+    if name == "translate":
+        # With a worker pool, requests can run as concurrently as there are workers
+        import worker_pool
+
+        concurrency = max(concurrency, worker_pool.WORKER_POOL_SIZE)
+    spec = os.environ.get(f"ADMISSION_{name.upper()}")
+    if spec:
+        c, _, q = spec.partition(":")
+        concurrency, max_queued = int(c), int(q or max_queued)
+    deadline = float(
+        os.environ.get(
+            f"REQUEST_DEADLINE_{name.upper()}",
+            REQUEST_DEADLINE_DEFAULTS.get(name, 300.0),
+        )
+    )
+    return concurrency, max_queued, deadline
+
+
+_queues: Dict[str, AdmissionQueue] = {}
+_deadlines: Dict[str, float] = {}
+
+
+def async_queue(name: str):
+    """Create the AsyncAdmissionQueue for an endpoint; returns (queue, default deadline)."""
+    concurrency, max_queued, deadline = _limits(name)
+    queue = _queues[name] = AsyncAdmissionQueue(name, concurrency, max_queued)
+    _deadlines[name] = deadline
+    return queue, deadline
+
+
+def request_budget(default: float, header_value: Optional[str]) -> float:
+    """Seconds a request may take: the endpoint default, or less if the client asks."""
+    try:
+        return min(default, float(header_value)) if header_value else default
+    except ValueError:
+        return default
+
+
+# Flask is imported where a view needs it, so the engine and the command-line
+# translator can use cancellation without the web stack installed
+
+
+def _request_socket() -> Optional[socket.socket]:
+    from flask import request
+
+    sock = request.environ.get("werkzeug.socket") or request.environ.get(
+        "gunicorn.socket"
+    )
+    return sock if isinstance(sock, socket.socket) else None
+
+
+def _error(status: int, message: str, retry_after: Optional[int] = None):
+    from flask import jsonify, make_response
+
+    response = make_response(jsonify({"error": message}), status)
+    if retry_after is not None:
+        response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def admit(name: str):
+    """
+    Wrap a Flask view with bounded admission and a cancellable deadline.
+    Shed requests get 429 (queue full) or 503 (waited too long) with Retry-After;
+    requests cancelled mid-flight get 504 (deadline) or 499 (client disconnected).
+    For streamed responses the slot and token are held until the stream closes.
+    """
+    concurrency, max_queued, default_deadline = _limits(name)
+    queue = _queues[name] = AdmissionQueue(name, concurrency, max_queued)
+    _deadlines[name] = default_deadline
+
+    def decorator(view):
+        from flask import make_response, request
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            budget = request_budget(
+                default_deadline, request.headers.get(TIMEOUT_HEADER)
+            )
+            start = time.monotonic()
+            token = CancelToken(start + budget, _request_socket())
+
+            shed = queue.acquire(min(ADMISSION_QUEUE_TIMEOUT, budget))
+            if shed is not None:
+                status = 429 if shed == "queue_full" else 503
+                return _error(status, f"Server busy ({shed})", queue.retry_after())
+
+            released = [False]
+
+            def finish():
+                if not released[0]:
+                    released[0] = True
+                    _local.token = None
+                    queue.release(time.monotonic() - start)
+
+            _local.token = token
+            try:
+                response = make_response(view(*args, **kwargs))
+            except RequestCancelled as e:
+                finish()
+                return _cancelled(queue, e.reason)
+            except BaseException:
+                finish()
+                raise
+
+            if response.is_streamed:
+                response.call_on_close(finish)
+            else:
+                finish()
+                queue.counts["completed"] += 1
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+# Status and message returned for each cancellation reason
+CANCELLED_RESPONSES = {
+    "deadline": (504, "Request deadline exceeded"),
+    "disconnected": (499, "Client closed request"),
+}
+
+
+def _cancelled(queue: AdmissionQueue, reason: str):
+    queue.counts[f"cancelled_{reason}"] += 1
+    log.info("%s request cancelled (%s)", queue.name, reason)
+    return _error(*CANCELLED_RESPONSES[reason])
+
+
+def record_cancelled(name: str, reason: str):
+    """Count a cancellation that happened after the response started streaming."""
+    queue = _queues.get(name)
+    if queue is not None:
+        queue.counts[f"cancelled_{reason}"] += 1
+
+
+def stats() -> Dict[str, Dict]:
+    return {
+        name: {**q.stats(), "deadline_seconds": _deadlines[name]}
+        for name, q in _queues.items()
+    }
+
+
+def make_stopping_criteria():
+    """
+    A transformers StoppingCriteria that ends generate() once the current
+    request is cancelled, or None outside a request.
+    """
+    token = current_token()
+    if token is None:
+        return None
+    return _CancelCriteria(token)
+
+
+class _CancelCriteria(StoppingCriteria):
+    def __init__(self, token: CancelToken):
+        self.token = token
+
+    def __call__(self, input_ids, scores, **kwargs):
+        stop = self.token.cancelled()
+        return torch.full(
+            (input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device
+        )
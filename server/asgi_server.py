@@ -0,0 +1,628 @@
+# asgi_server.py
+"""
+asyncio front end for /translate and /translate-document-advanced, with the
+same request and response contract as the Flask endpoints in server.py.
+
+The event loop only does I/O: uploads are streamed into spooled temporary files
+as they arrive and idle or slow clients cost no thread. Model work runs on a
+small inference executor and PyMuPDF work on a separate PDF executor, so the
+total thread count stays fixed however many connections are open.
+
+Run with:  uvicorn asgi_server:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import contextvars
+import email.message
+import functools
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import admission
+import doc_translator
+import glossary
+import logs
+import server
+
+# ----------------------
+# Configuration
+# ----------------------
+# Threads running generate(); the model already uses intra-op parallelism
+ASGI_INFERENCE_THREADS = int(os.environ.get("ASGI_INFERENCE_THREADS", "1"))
+# Threads running PyMuPDF extraction and layout for PDF requests
+ASGI_PDF_THREADS = int(os.environ.get("ASGI_PDF_THREADS", "2"))
+# Threads writing uploads to disk once they outgrow memory
+ASGI_IO_THREADS = int(os.environ.get("ASGI_IO_THREADS", "2"))
+# Uploads are kept in memory up to this size, then spooled to a temporary file
+ASGI_SPOOL_MEMORY_MB = float(os.environ.get("ASGI_SPOOL_MEMORY_MB", "4"))
+# Largest accepted PDF upload and JSON body
+ASGI_MAX_UPLOAD_MB = float(os.environ.get("ASGI_MAX_UPLOAD_MB", "200"))
+ASGI_MAX_JSON_KB = float(os.environ.get("ASGI_MAX_JSON_KB", "1024"))
+
+# Largest header block and text field accepted in a multipart body
+_MAX_PART_HEADERS = 16 * 1024
+_MAX_FORM_FIELD = 64 * 1024
+_RESPONSE_CHUNK = 256 * 1024
+
+_EXPOSE_HEADERS = f"X-Pages-Reused, X-Pages-Recomputed, {logs.REQUEST_ID_HEADER}"
+
+_inference_executor = ThreadPoolExecutor(
+    ASGI_INFERENCE_THREADS, thread_name_prefix="asgi-inference"
+)
+_pdf_executor = ThreadPoolExecutor(ASGI_PDF_THREADS, thread_name_prefix="asgi-pdf")
+_io_executor = ThreadPoolExecutor(ASGI_IO_THREADS, thread_name_prefix="asgi-io")
+
+log = logging.getLogger("asgi_server")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ----------------------
+# Request body handling
+# ----------------------
+class MultipartParser:
+    """
+    Incremental multipart/form-data parser. feed() takes body chunks as they
+    arrive and returns ("begin", headers), ("data", bytes) and ("end", None)
+    events, holding back only enough bytes to recognise a split boundary.
+    """
+
+    def __init__(self, boundary: bytes):
+        self._delimiter = b"--" + boundary
+        self._body_delimiter = b"\r\n" + self._delimiter
+        self._buf = bytearray()
+        self._state = "preamble"
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: bytes) -> List[Tuple[str, object]]:
+        buf = self._buf
+        buf += chunk
+        events = []
+        while True:
+            if self._state == "preamble":
+                idx = buf.find(self._delimiter)
+                if idx < 0:
+                    del buf[: max(0, len(buf) - len(self._delimiter))]
+                    break
+                del buf[: idx + len(self._delimiter)]
+                self._state = "delimiter"
+            elif self._state == "delimiter":
+                if len(buf) < 2:
+                    break
+                if buf[:2] == b"--":
+                    self._state = "done"
+                    buf.clear()
+                    break
+                if buf[:2] != b"\r\n":
+                    raise HTTPError(400, "Malformed multipart body")
+                del buf[:2]
+                self._state = "headers"
+            elif self._state == "headers":
+                idx = buf.find(b"\r\n\r\n")
+                if idx < 0:
+                    if len(buf) > _MAX_PART_HEADERS:
+                        raise HTTPError(400, "Multipart headers too large")
+                    break
+                events.append(("begin", _parse_part_headers(bytes(buf[:idx]))))
+                del buf[: idx + 4]
+                self._state = "body"
+            elif self._state == "body":
+                idx = buf.find(self._body_delimiter)
+                if idx < 0:
+                    # Keep a tail long enough to hold a delimiter split across chunks
+                    safe = len(buf) - len(self._body_delimiter)
+                    if safe > 0:
+                        events.append(("data", bytes(buf[:safe])))
+                        del buf[:safe]
+                    break
+                if idx:
+                    events.append(("data", bytes(buf[:idx])))
+                events.append(("end", None))
+                del buf[: idx + len(self._body_delimiter)]
+                self._state = "delimiter"
+            else:
+                buf.clear()
+                break
+        return events
+
+
+def _parse_part_headers(raw: bytes) -> Dict[str, Optional[str]]:
+    msg = email.message.Message()
+    for line in raw.decode("utf-8", errors="replace").split("\r\n"):
+        key, sep, value = line.partition(":")
+        if sep:
+            msg[key.strip()] = value.strip()
+    return {
+        "name": msg.get_param("name", header="content-disposition"),
+        "filename": msg.get_filename(),
+    }
+
+
+def _boundary(content_type: str) -> Optional[bytes]:
+    msg = email.message.Message()
+    msg["Content-Type"] = content_type
+    if msg.get_content_type() != "multipart/form-data":
+        return None
+    boundary = msg.get_param("boundary")
+    return boundary.encode("latin-1") if isinstance(boundary, str) else None
+
+
+async def _iter_body(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise admission.RequestCancelled("disconnected")
+        body = message.get("body", b"")
+        if body:
+            yield body
+        if not message.get("more_body", False):
+            return
+
+
+async def read_body(receive, limit: int) -> bytes:
+    chunks, size = [], 0
+    async for chunk in _iter_body(receive):
+        size += len(chunk)
+        if size > limit:
+            raise HTTPError(413, "Request body too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class Upload:
+    """A file part spooled to memory, then to disk once it outgrows ASGI_SPOOL_MEMORY_MB."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.size = 0
+        self._memory_limit = int(ASGI_SPOOL_MEMORY_MB * 1024 * 1024)
+        self.file = tempfile.SpooledTemporaryFile(max_size=self._memory_limit)
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        if self.size <= self._memory_limit:
+            self.file.write(data)
+        else:
+            # Rolls over to / appends to a file on disk; keep that off the event loop
+            await asyncio.get_running_loop().run_in_executor(
+                _io_executor, self.file.write, data
+            )
+
+    def read_all(self) -> bytes:
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self):
+        self.file.close()
+
+
+async def read_form(
+    receive, content_type: str, max_upload: int
+) -> Tuple[Dict[str, str], Dict[str, Upload]]:
+    """Stream a multipart/form-data body into text fields and spooled uploads."""
+    boundary = _boundary(content_type)
+    if boundary is None:
+        raise HTTPError(400, "Expected multipart/form-data")
+    parser = MultipartParser(boundary)
+    fields: Dict[str, str] = {}
+    files: Dict[str, Upload] = {}
+    part = None
+    field_buf = bytearray()
+    try:
+        async for chunk in _iter_body(receive):
+            for kind, value in parser.feed(chunk):
+                if kind == "begin":
+                    part = value
+                    if part["filename"] is not None:
+                        files[part["name"]] = Upload(part["filename"])
+                    field_buf.clear()
+                elif kind == "data":
+                    if part["filename"] is not None:
+                        upload = files[part["name"]]
+                        if upload.size + len(value) > max_upload:
+                            raise HTTPError(413, "Uploaded file too large")
+                        await upload.write(value)
+                    else:
+                        field_buf += value
+                        if len(field_buf) > _MAX_FORM_FIELD:
+                            raise HTTPError(413, "Form field too large")
+                elif part["filename"] is None and part["name"]:
+                    fields[part["name"]] = field_buf.decode("utf-8", errors="replace")
+        if not parser.done:
+            raise HTTPError(400, "Incomplete multipart body")
+    except BaseException:
+        for upload in files.values():
+            upload.close()
+        raise
+    return fields, files
+
+
+# ----------------------
+# Responses
+# ----------------------
+def _cors_headers() -> List[Tuple[bytes, bytes]]:
+    return [
+        (b"access-control-allow-origin", b"*"),
+        (b"access-control-expose-headers", _EXPOSE_HEADERS.encode()),
+        (logs.REQUEST_ID_HEADER.lower().encode(), (logs.request_id() or "").encode()),
+    ]
+
+
+async def send_response(
+    send,
+    status: int,
+    body: bytes,
+    content_type: str = "application/json",
+    headers: Optional[Dict[str, str]] = None,
+):
+    raw_headers = [
+        (b"content-type", content_type.encode()),
+        (b"content-length", str(len(body)).encode()),
+        *_cors_headers(),
+    ]
+    for key, value in (headers or {}).items():
+        raw_headers.append((key.lower().encode(), value.encode("latin-1")))
+    await send(
+        {"type": "http.response.start", "status": status, "headers": raw_headers}
+    )
+    for i in range(0, max(len(body), 1), _RESPONSE_CHUNK):
+        await send(
+            {
+                "type": "http.response.body",
+                "body": body[i : i + _RESPONSE_CHUNK],
+                "more_body": i + _RESPONSE_CHUNK < len(body),
+            }
+        )
+
+
+async def send_json(send, status: int, obj, headers: Optional[Dict[str, str]] = None):
+    body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    await send_response(send, status, body, headers=headers)
+
+
+def _content_disposition(filename: str) -> str:
+    fallback = filename.encode("ascii", errors="replace").decode().replace('"', "")
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+async def _preflight(scope, send):
+    request_headers = dict(scope["headers"])
+    allow_headers = request_headers.get(b"access-control-request-headers", b"*")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                *_cors_headers(),
+                (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+                (b"access-control-allow-headers", allow_headers),
+                (b"content-length", b"0"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": b""})
+
+
+# ----------------------
+# Offloaded work
+# ----------------------
+def _with_token(token: admission.CancelToken, fn, *args, **kwargs):
+    """Run fn on an executor thread with the request's cancel token bound."""
+    admission.set_token(token)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        admission.set_token(None)
+
+
+async def run_in(executor, token: admission.CancelToken, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Executor threads do not inherit the task's context (request id); pass it along
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        executor, ctx.run, functools.partial(_with_token, token, fn, *args, **kwargs)
+    )
+
+
+async def _watch_disconnect(receive, token: admission.CancelToken):
+    """Once the body is consumed, the next ASGI message can only be a disconnect."""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            token.cancel("disconnected")
+            return
+
+
+def _translate_job(text, src_lang, tgt_lang, glossary_obj):
+    translated = server.translate_text(text, src_lang, tgt_lang, glossary_obj)
+    server.cache.unload_translation()
+    return translated
+
+
+def _document_job(upload: Upload, src_lang, tgt_lang, glossary_obj, token):
+    def translate_batch_fn(texts, src, tgt, glossary_obj=None):
+        # Inference runs on its own executor so PDF threads never hold the model
+        ctx = contextvars.copy_context()
+        return _inference_executor.submit(
+            ctx.run,
+            _with_token,
+            token,
+            server.translate_batch,
+            texts,
+            src,
+            tgt,
+            glossary_obj,
+        ).result()
+
+    page_stats = {}
+    buf = doc_translator.translate_pdf_bytes_preserve_layout(
+        upload.read_all(),
+        src_lang,
+        tgt_lang,
+        stats=page_stats,
+        glossary_obj=glossary_obj,
+        translate_batch_fn=translate_batch_fn,
+    )
+    return buf.getvalue(), page_stats
+
+
+def _lookup_glossary(name: Optional[str]):
+    if not name:
+        return None
+    glossary_obj = glossary.store.get(name)
+    if glossary_obj is None:
+        raise HTTPError(400, f"Unknown glossary: {name}")
+    return glossary_obj
+
+
+# ----------------------
+# Endpoints
+# ----------------------
+async def translate_endpoint(scope, receive, send, token):
+    try:
+        data = json.loads(await read_body(receive, int(ASGI_MAX_JSON_KB * 1024)))
+    except ValueError:
+        raise HTTPError(400, "Invalid JSON")
+    if not isinstance(data, dict) or "text" not in data:
+        raise HTTPError(400, "No text provided")
+
+    text = data["text"]
+    src_lang = data.get("src_lang", "English")
+    tgt_lang = data.get("tgt_lang", "English")
+    glossary_obj = _lookup_glossary(data.get("glossary"))
+    # Script detection takes microseconds, so it stays on the event loop
+    detected_lang = server.language_id.source_languages([text], src_lang)[0]
+    log.info(
+        "/translate %s → %s",
+        detected_lang,
+        tgt_lang,
+        extra={"chars": len(text), "requested_src": src_lang},
+    )
+
+    async def respond():
+        translated = await run_in(
+            _inference_executor,
+            token,
+            _translate_job,
+            text,
+            detected_lang,
+            tgt_lang,
+            glossary_obj,
+        )
+        await send_json(
+            send,
+            200,
+            {
+                "detected_lang": detected_lang,
+                "translation": translated,
+                "translated_to": tgt_lang,
+            },
+        )
+
+    return respond
+
+
+async def translate_document_endpoint(scope, receive, send, token):
+    content_type = _header(scope, b"content-type")
+    fields, files = await read_form(
+        receive, content_type, int(ASGI_MAX_UPLOAD_MB * 1024 * 1024)
+    )
+    upload = files.get("file")
+    try:
+        if upload is None:
+            raise HTTPError(400, "No file part")
+        if upload.filename == "":
+            raise HTTPError(400, "No selected file")
+        src_lang = fields.get("src_lang", "English")
+        tgt_lang = fields.get("tgt_lang", "English")
+        glossary_obj = _lookup_glossary(fields.get("glossary"))
+    except BaseException:
+        _close_uploads(files)
+        raise
+    log.info(
+        "/translate-document-advanced %s → %s",
+        src_lang,
+        tgt_lang,
+        extra={"upload_kb": round(upload.size / 1024)},
+    )
+
+    async def respond():
+        try:
+            pdf, page_stats = await run_in(
+                _pdf_executor,
+                token,
+                _document_job,
+                upload,
+                src_lang,
+                tgt_lang,
+                glossary_obj,
+                token,
+            )
+        except (HTTPError, admission.RequestCancelled):
+            raise
+        except Exception as e:
+            log.exception("Error translating PDF")
+            raise HTTPError(500, str(e))
+        finally:
+            _close_uploads(files)
+        await send_response(
+            send,
+            200,
+            pdf,
+            content_type="application/pdf",
+            headers={
+                "Content-Disposition": _content_disposition(
+                    f"translated_{upload.filename}"
+                ),
+                "X-Pages-Reused": str(page_stats.get("pages_reused", 0)),
+                "X-Pages-Recomputed": str(page_stats.get("pages_recomputed", 0)),
+            },
+        )
+
+    # Called by _handle even when respond never runs (shed or past the deadline)
+    respond.close = lambda: _close_uploads(files)
+    return respond
+
+
+def _close_uploads(files: Dict[str, Upload]):
+    for upload in files.values():
+        upload.close()
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+# Path → (admission name, handler). A handler reads and validates the request,
+# then returns a coroutine function that does the admitted work and responds.
+# If that function has a close() attribute, it is called once the request is
+# over, whether or not it ran.
+ROUTES = {
+    "/translate": ("translate", translate_endpoint),
+    "/translate-document-advanced": ("document", translate_document_endpoint),
+}
+_queues: Dict[str, Tuple[admission.AsyncAdmissionQueue, float]] = {}
+
+
+async def _handle(scope, receive, send, name, handler):
+    queue, default_deadline = _queues[name]
+    budget = admission.request_budget(
+        default_deadline, _header(scope, admission.TIMEOUT_HEADER.lower().encode())
+    )
+    start = time.monotonic()
+    token = admission.CancelToken(start + budget)
+
+    # Reading the body happens before admission, so slow uploads hold no slot
+    try:
+        respond = await asyncio.wait_for(
+            handler(scope, receive, send, token), max(0.0, token.remaining())
+        )
+    except asyncio.TimeoutError:
+        return await _send_cancelled(send, queue, "deadline")
+
+    try:
+        shed = await queue.acquire(
+            min(admission.ADMISSION_QUEUE_TIMEOUT, token.remaining())
+        )
+        if shed is not None:
+            status = 429 if shed == "queue_full" else 503
+            return await send_json(
+                send,
+                status,
+                {"error": f"Server busy ({shed})"},
+                headers={"Retry-After": str(queue.retry_after())},
+            )
+
+        watcher = asyncio.ensure_future(_watch_disconnect(receive, token))
+        try:
+            await respond()
+            queue.counts["completed"] += 1
+        except admission.RequestCancelled as e:
+            await _send_cancelled(send, queue, e.reason)
+        finally:
+            watcher.cancel()
+            queue.release(time.monotonic() - start)
+    finally:
+        close = getattr(respond, "close", None)
+        if close is not None:
+            close()
+
+
+async def _send_cancelled(send, queue, reason: str):
+    admission.record_cancelled(queue.name, reason)
+    log.info("%s request cancelled (%s)", queue.name, reason)
+    status, message = admission.CANCELLED_RESPONSES[reason]
+    try:
+        await send_json(send, status, {"error": message})
+    except OSError:
+        # The client is already gone
+        pass
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            for name, _ in ROUTES.values():
+                _queues[name] = admission.async_queue(name)
+            log.info(
+                "Ready: %d inference, %d PDF, %d I/O threads",
+                ASGI_INFERENCE_THREADS,
+                ASGI_PDF_THREADS,
+                ASGI_IO_THREADS,
+            )
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            for executor in (_inference_executor, _pdf_executor, _io_executor):
+                executor.shutdown(wait=False, cancel_futures=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    if not _queues:
+        # Servers started without lifespan support
+        for name, _ in ROUTES.values():
+            _queues[name] = admission.async_queue(name)
+
+    path, method = scope["path"], scope["method"]
+    logs.new_request_id(_header(scope, logs.REQUEST_ID_HEADER.lower().encode()))
+    if path == "/admission-stats" and method == "GET":
+        return await send_json(send, 200, admission.stats())
+    route = ROUTES.get(path)
+    if route is None:
+        return await send_json(send, 404, {"error": "Not found"})
+    if method == "OPTIONS":
+        return await _preflight(scope, send)
+    if method != "POST":
+        return await send_json(send, 405, {"error": "Method not allowed"})
+
+    try:
+        await _handle(scope, receive, send, *route)
+    except HTTPError as e:
+        await send_json(send, e.status, {"error": e.message})
+    except admission.RequestCancelled as e:
+        # Client went away while still uploading; there is nobody to answer
+        log.info("%s request cancelled (%s)", path, e.reason)
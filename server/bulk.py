@@ -0,0 +1,132 @@
+# bulk.py
+import json
+import os
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# ----------------------
+# Configuration
+# ----------------------
+# Texts per generate() call
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", "32"))
+# Records held in memory at once, across all directions
+BULK_MAX_BUFFERED = int(os.environ.get("BULK_MAX_BUFFERED", "2048"))
+
+# Marker translate_batch returns for texts that failed
+TRANSLATION_ERROR = "[Translation Error]"
+# Error reported for records whose translation failed (worth retrying)
+TRANSLATION_FAILED = "Translation failed"
+
+Direction = Tuple[str, str]
+
+
+def parse_ndjson(
+    lines: Iterable,
+    default_src: str = "English",
+    default_tgt: str = "English",
+    lang_codes: Optional[Dict[str, str]] = None,
+    first_line: int = 0,
+    auto_lang: Optional[str] = None,
+) -> Iterator[Dict]:
+    """
+    Parse NDJSON/JSONL lines (bytes or str) into {id, text, src_lang, tgt_lang}
+    records. Lines that cannot be used come back as {id, error} records.
+    Record ids default to the line number (counted from first_line).
+    auto_lang is accepted as a source language besides those in lang_codes.
+    """
+    for line_no, line in enumerate(lines, first_line):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            yield {"id": line_no, "error": f"Invalid JSON: {e}"}
+            continue
+        if not isinstance(obj, dict):
+            yield {"id": line_no, "error": "Record must be a JSON object"}
+            continue
+        rec_id = obj.get("id", line_no)
+        text = obj.get("text")
+        if not isinstance(text, str):
+            yield {"id": rec_id, "error": "No text provided"}
+            continue
+        src_lang = obj.get("src_lang", default_src)
+        tgt_lang = obj.get("tgt_lang", default_tgt)
+        if lang_codes is not None and (
+            (src_lang not in lang_codes and src_lang != auto_lang)
+            or tgt_lang not in lang_codes
+        ):
+            yield {
+                "id": rec_id,
+                "error": f"Unsupported language pair {src_lang} → {tgt_lang}",
+            }
+            continue
+        yield {"id": rec_id, "text": text, "src_lang": src_lang, "tgt_lang": tgt_lang}
+
+
+def iter_bulk_translations(
+    records: Iterable[Dict],
+    translate_batch_fn: Callable[[List[str], str, str], List[str]],
+    batch_size: int = BULK_BATCH_SIZE,
+    max_buffered: int = BULK_MAX_BUFFERED,
+) -> Iterator[Dict]:
+    """
+    Translate a stream of records in large batches grouped by direction and length.
+
+    Records are buffered per (src_lang, tgt_lang). Once the total buffer reaches
+    max_buffered, the fullest direction is sorted by length and translated in
+    batch_size chunks, so padding stays low and memory is bounded regardless of
+    the input size. Results are yielded in completion order as
+    {id, translation, src_lang, tgt_lang}; failed translations and records that
+    were already errors come back as {id, error}.
+    """
+    buckets: Dict[Direction, List[Dict]] = defaultdict(list)
+    buffered = 0
+
+    def flush(direction: Direction, full_batches_only: bool) -> Iterator[Dict]:
+        nonlocal buffered
+        pending = buckets[direction]
+        pending.sort(key=lambda r: len(r["text"]))
+        n = len(pending)
+        if full_batches_only:
+            n -= n % batch_size
+        for i in range(0, n, batch_size):
+            chunk = pending[i : i + batch_size]
+            translations = translate_batch_fn(
+                [r["text"] for r in chunk], direction[0], direction[1]
+            )
+            for rec, translation in zip(chunk, translations):
+                if translation == TRANSLATION_ERROR:
+                    yield {"id": rec["id"], "error": TRANSLATION_FAILED}
+                    continue
+                yield {
+                    "id": rec["id"],
+                    "translation": translation,
+                    "src_lang": direction[0],
+                    "tgt_lang": direction[1],
+                }
+        buckets[direction] = pending[n:]
+        buffered -= n
+        if not buckets[direction]:
+            del buckets[direction]
+
+    for rec in records:
+        if "error" in rec:
+            yield rec
+            continue
+        direction = (rec["src_lang"], rec["tgt_lang"])
+        buckets[direction].append(rec)
+        buffered += 1
+        # Wait until the buffer is full so each direction gets sorted by length
+        # over a large window, then drain whole batches of the fullest direction
+        if buffered >= max_buffered:
+            fullest = max(buckets, key=lambda d: len(buckets[d]))
+            yield from flush(
+                fullest, full_batches_only=len(buckets[fullest]) >= batch_size
+            )
+
+    for direction in list(buckets):
+        yield from flush(direction, full_batches_only=False)
@@ -1,14 +1,30 @@
 # doc_translator.py
+import hashlib
 import html
 import io
+import logging
 import os
 import tempfile
+import threading
+from collections import Counter
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 import fitz  # pymupdf
 
-from server import translate_text
+import admission
+import bulk
+import logs
+import page_store
+
+log = logging.getLogger("doc_translator")
+
+
+def _default_translate_batch(texts, src_lang, tgt_lang, glossary_obj=None):
+    # Imported lazily, so callers passing translate_batch_fn never load the engine
+    from engine import translate_batch
+
+    return translate_batch(texts, src_lang, tgt_lang, glossary_obj)
 
 
 def extract_blocks_with_lines(page) -> List[Dict]:
@@ -327,6 +343,75 @@ def _expand_rect_to_available_space(
     return best
 
 
+def _placement_envelope(
+    original_rect: fitz.Rect,
+    page_rect: fitz.Rect,
+    max_expand_pixels: int = 80,
+    step: int = 8,
+    margin: float = 4.0,
+) -> fitz.Rect:
+    """
+    Smallest rect containing original_rect and every candidate that
+    _expand_rect_to_available_space may try for it. The candidates are nested,
+    so this is original_rect joined with the largest one.
+    """
+    expands = range(step, max_expand_pixels + step, step)
+    if not expands:
+        return fitz.Rect(original_rect)
+    expand = expands[-1]
+    return fitz.Rect(
+        min(
+            original_rect.x0, max(page_rect.x0 + margin, original_rect.x0 - expand // 2)
+        ),
+        min(
+            original_rect.y0, max(page_rect.y0 + margin, original_rect.y0 - expand // 4)
+        ),
+        max(
+            original_rect.x1, min(page_rect.x1 - margin, original_rect.x1 + expand // 2)
+        ),
+        max(
+            original_rect.y1, min(page_rect.y1 - margin, original_rect.y1 + expand // 4)
+        ),
+    )
+
+
+def _envelopes_are_free(
+    envelopes: List[fitz.Rect], image_rects: List[fitz.Rect], margin: float
+) -> bool:
+    """
+    True if no envelope overlaps an image or another envelope. Every block of
+    such a page can then be placed at its original position and expanded without
+    ever meeting an occupied rect.
+    """
+    for env in envelopes:
+        for img in image_rects:
+            if _rects_overlap(env, img, margin):
+                return False
+    # Sweep over envelopes sorted by top edge; only vertical neighbours can overlap
+    ordered = sorted(envelopes, key=lambda r: r.y0)
+    for i, env in enumerate(ordered):
+        for other in ordered[i + 1 :]:
+            if other.y0 >= env.y1 + margin:
+                break
+            if _rects_overlap(env, other, margin):
+                return False
+    return True
+
+
+# Set PLACEMENT_VERIFY=1 to also run the full search for fast-path blocks and
+# report any placement that differs (for checking against a regression corpus)
+PLACEMENT_VERIFY = os.environ.get("PLACEMENT_VERIFY", "0") == "1"
+
+# Page-type and block-path histogram across all translated pages
+_placement_stats = Counter()
+_placement_stats_lock = threading.Lock()
+
+
+def get_placement_stats() -> Dict[str, int]:
+    with _placement_stats_lock:
+        return dict(_placement_stats)
+
+
 def _fontfile_to_file_uri(fontfile: Optional[str]) -> Optional[str]:
     if not fontfile:
         return None
@@ -407,11 +492,357 @@ def _choose_font_for_lang(tgt_lang: str, fonts_dir: str) -> Optional[str]:
     return None
 
 
+def _page_fingerprint(
+    page: fitz.Page, blocks: List[Dict], image_rects: List[fitz.Rect]
+) -> str:
+    """
+    Hash the extracted layout of a page (page geometry, block texts and bboxes,
+    image rects) so an unchanged page in a revised upload can be recognised.
+    The content streams and the raw image and form XObject streams are hashed
+    too, so a page with a changed image or drawing is never taken for it.
+    """
+    h = hashlib.sha256()
+    x0, y0, x1, y1 = _rect_coords(page.rect)
+    h.update(f"page|{x0:.1f},{y0:.1f},{x1:.1f},{y1:.1f}|{page.rotation}\n".encode())
+    for blk in blocks:
+        bx0, by0, bx1, by1 = blk["bbox"]
+        h.update(
+            f"block|{bx0:.1f},{by0:.1f},{bx1:.1f},{by1:.1f}|{blk.get('avg_font_size', 0):.2f}\n".encode()
+        )
+        for line in blk["lines"]:
+            lx0, ly0, lx1, ly1 = line["bbox"]
+            h.update(f"line|{lx0:.1f},{ly0:.1f},{lx1:.1f},{ly1:.1f}|".encode())
+            h.update(line["text"].encode("utf-8", "surrogatepass"))
+            h.update(b"\n")
+    for img in image_rects:
+        ix0, iy0, ix1, iy1 = _rect_coords(img)
+        h.update(f"image|{ix0:.1f},{iy0:.1f},{ix1:.1f},{iy1:.1f}\n".encode())
+
+    # Vector drawings and inline images live in the content streams
+    h.update(b"contents|")
+    h.update(page.read_contents())
+    doc = page.parent
+    xrefs = []
+    for img in page.get_images(full=True):
+        xrefs.extend(x for x in img[:2] if x > 0)  # image and its soft mask
+    xrefs.extend(xobj[0] for xobj in page.get_xobjects())
+    for xref in xrefs:
+        # By content, not xref number, which changes when an editor re-saves
+        h.update(b"\nxobject|")
+        h.update(hashlib.sha256(doc.xref_stream_raw(xref) or b"").digest())
+    return h.hexdigest()
+
+
+def _single_page_pdf_bytes(doc, page_idx: int) -> bytes:
+    """Return page page_idx of doc as a standalone (font-subset) PDF."""
+    single = fitz.open()
+    try:
+        single.insert_pdf(doc, from_page=page_idx, to_page=page_idx)
+        try:
+            single.subset_fonts()
+        except Exception:
+            pass
+        return single.tobytes(garbage=3, deflate=True)
+    finally:
+        single.close()
+
+
+def _swap_in_page(doc, page_idx: int, data: bytes):
+    """
+    Give page page_idx of doc the contents and resources of the single-page PDF
+    data, keeping the page object itself: its links, annotations, labels and the
+    outline entries pointing at it stay as they are.
+    """
+    cached = fitz.open(stream=data, filetype="pdf")
+    try:
+        doc.insert_pdf(cached, links=False, annots=False, widgets=False)
+    finally:
+        cached.close()
+    page_xref = doc.page_xref(page_idx)
+    copy_xref = doc.page_xref(len(doc) - 1)
+    for key in ("Contents", "Resources"):
+        doc.xref_set_key(page_xref, key, doc.xref_get_key(copy_xref, key)[1])
+    doc.delete_page(len(doc) - 1)
+
+
+def _search_placement(
+    original_rect: fitz.Rect,
+    occupied_rects: List[fitz.Rect],
+    page_rect: fitz.Rect,
+    blk_idx: int,
+) -> fitz.Rect:
+    """Collision-avoiding placement: find a safe rect, then grow it into free space."""
+    # Find safe placement that doesn't overlap
+    safe_rect = _find_safe_placement_rect(
+        original_rect, occupied_rects, page_rect, margin=3.0
+    )
+
+    # If a safe rect is found, see if we can expand it a bit to allow larger text
+    if safe_rect is None:
+        if logs.sampled("placement_not_found"):
+            log.warning(
+                "Could not find safe placement for block %d, using original position "
+                "(1 in %d logged)",
+                blk_idx,
+                logs.LOG_SAMPLE_EVERY,
+            )
+        safe_rect = original_rect
+
+    # Try to expand available space (so we can fit bigger fonts) while keeping it safe
+    return _expand_rect_to_available_space(
+        safe_rect,
+        occupied_rects,
+        page_rect,
+        max_expand_pixels=80,
+        step=8,
+        margin=3.0,
+    )
+
+
+def _translate_page(
+    page: fitz.Page,
+    blocks: List[Dict],
+    image_rects: List[fitz.Rect],
+    src_lang: str,
+    tgt_lang: str,
+    fontfile_uri: Optional[str],
+    glossary_obj=None,
+    translate_batch_fn: Callable = _default_translate_batch,
+):
+    """
+    Translate a single page in place: place translated blocks in free space,
+    redact the original text and insert the translations.
+    All blocks of the page are translated in one batch.
+    Returns a histogram of the page type and of the placement path taken by each block,
+    plus translation_errors: blocks translate_batch_fn reported as failed.
+    """
+    page_rect = page.rect
+
+    # Sort blocks by vertical position (top to bottom) for better ordering
+    blocks.sort(key=lambda b: (b["bbox"][1], b["bbox"][0]))
+
+    # Free-space map: the area each block could occupy after expansion. If no
+    # envelope touches an image or another envelope the whole page is placed
+    # directly; otherwise a block is placed directly when its envelope is clear
+    # of everything occupied so far, and only real conflicts run the search.
+    envelopes = [
+        _placement_envelope(
+            fitz.Rect(blk["bbox"]), page_rect, max_expand_pixels=80, step=8, margin=3.0
+        )
+        for blk in blocks
+    ]
+    page_is_free = _envelopes_are_free(envelopes, image_rects, margin=3.0)
+    placement = Counter()
+
+    # Track occupied areas (images + already placed text)
+    occupied_rects = image_rects.copy()
+
+    # Store translated blocks with their placement info
+    translated_placements = []
+
+    # Build original text from lines and translate the whole page at once
+    original_texts = [" ".join(line["text"] for line in blk["lines"]) for blk in blocks]
+    translated_texts = translate_batch_fn(
+        original_texts, src_lang, tgt_lang, glossary_obj
+    )
+
+    for blk_idx, (blk, translated_text) in enumerate(zip(blocks, translated_texts)):
+        if not translated_text.strip():
+            continue
+        if translated_text == bulk.TRANSLATION_ERROR:
+            placement["translation_errors"] += 1
+
+        # Get original font size for consistency
+        original_font_size = blk.get("avg_font_size", 12.0)
+        if original_font_size == 0 or original_font_size < 6:
+            original_font_size = 12.0
+
+        # Use original bbox as starting point
+        original_rect = fitz.Rect(blk["bbox"])
+
+        if page_is_free:
+            path = "block_direct_proven"
+        elif not any(
+            _rects_overlap(envelopes[blk_idx], occupied, 3.0)
+            for occupied in occupied_rects
+        ):
+            path = "block_direct_checked"
+        else:
+            path = "block_search"
+        placement[path] += 1
+
+        if path != "block_search":
+            # Nothing occupied within reach: the original position is safe and
+            # every expansion candidate is conflict-free
+            expanded_rect = _expand_rect_to_available_space(
+                original_rect,
+                [],
+                page_rect,
+                max_expand_pixels=80,
+                step=8,
+                margin=3.0,
+            )
+            if PLACEMENT_VERIFY:
+                searched = _search_placement(
+                    original_rect, occupied_rects, page_rect, blk_idx
+                )
+                if tuple(searched) != tuple(expanded_rect):
+                    placement["block_verify_mismatch"] += 1
+                    log.warning(
+                        "Placement mismatch for block %d: fast %s vs search %s",
+                        blk_idx,
+                        tuple(expanded_rect),
+                        tuple(searched),
+                    )
+        else:
+            expanded_rect = _search_placement(
+                original_rect, occupied_rects, page_rect, blk_idx
+            )
+
+        # Add this rect to occupied areas for next blocks (reserve the expanded rect)
+        occupied_rects.append(expanded_rect)
+
+        # Store placement info
+        translated_placements.append(
+            {
+                "rect": expanded_rect,
+                "text": translated_text,
+                "font_size": original_font_size,
+                "original_rect": original_rect,
+            }
+        )
+
+    if not blocks:
+        page_type = "page_empty"
+    elif page_is_free:
+        page_type = "page_text_only_fast" if not image_rects else "page_images_fast"
+    elif placement["block_search"]:
+        page_type = "page_conflict"
+    else:
+        page_type = "page_checked"
+    placement[page_type] += 1
+
+    # Now redact all original text in one pass
+    for blk in blocks:
+        block_rect = fitz.Rect(blk["bbox"])
+
+        # Check if this block overlaps with any images
+        has_image_overlap = any(
+            _rects_overlap(block_rect, img, margin=0) for img in image_rects
+        )
+
+        if not has_image_overlap:
+            # Safe to redact entire block
+            page.add_redact_annot(block_rect, fill=(1, 1, 1))
+        else:
+            # Redact line by line, avoiding images
+            for line in blk["lines"]:
+                line_rect = fitz.Rect(line["bbox"])
+                line_overlaps_image = any(
+                    _rects_overlap(line_rect, img, margin=0) for img in image_rects
+                )
+
+                if not line_overlaps_image:
+                    page.add_redact_annot(line_rect, fill=(1, 1, 1))
+
+    # Apply all redactions at once
+    try:
+        page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE)
+    except Exception as e:
+        log.warning("Redaction failed: %s", e)
+
+    # Insert all translated text with consistent font sizing
+    for placed in translated_placements:
+        rect = placed["rect"]
+        text = placed["text"]
+        original_fs = placed["font_size"]
+
+        # Count lines in translated text
+        num_lines = max(1, text.count("\n") + 1)
+
+        # Height constraint: give up to ~85% of line-height for font
+        height_per_line = rect.height / num_lines
+        max_fs_by_height = height_per_line * 0.85
+
+        # Width constraint: estimate average characters per line and compute an approximate font size
+        avg_chars_per_line = max(1.0, len(text) / num_lines)
+        # Rough estimate: average character width in points is ~0.5 * fontsize (varies by font). We solve for fs such that avg_chars_per_line * (0.5 * fs) <= rect.width
+        if avg_chars_per_line > 0:
+            max_fs_by_width = (rect.width / avg_chars_per_line) * 1.8  # tuned factor
+        else:
+            max_fs_by_width = max_fs_by_height
+
+        # Allow slightly larger than original if space permits but cap it
+        max_allowed_fs = min(24.0, original_fs * 1.4)
+
+        # Start with the lesser of calculated maxima and the allowed cap
+        target_fs = min(max_fs_by_height, max_fs_by_width, max_allowed_fs)
+
+        # Ensure a comfortable minimum for readability
+        target_fs = max(8.0, target_fs)
+
+        # If the rect was expanded then we can try starting a little larger to prefer bigger text
+        start_fs = min(28.0, target_fs * 1.12)
+
+        # Prepare HTML-safe text
+        safe_text = html.escape(text).replace("\n", "<br/>")
+
+        # Try to insert with HTML (it will shrink if needed)
+        success_fs = _insert_html_with_shrink(
+            page,
+            rect,
+            safe_text,
+            fontfile_uri,
+            start_fs=start_fs,
+            min_fs=max(6.0, target_fs * 0.55),
+        )
+
+        if success_fs == 0:
+            # Fallback to insert_textbox - try with the target_fs (rounded)
+            if logs.sampled("html_insert_failed"):
+                log.info(
+                    "HTML insertion failed, using textbox fallback (1 in %d logged)",
+                    logs.LOG_SAMPLE_EVERY,
+                )
+            try:
+                # insert_textbox uses 'fontsize' in points; convert to int but keep >=8
+                textbox_fs = max(8, int(round(target_fs)))
+                page.insert_textbox(
+                    rect,
+                    text,
+                    fontsize=textbox_fs,
+                    align=0,
+                    overlay=True,
+                )
+            except Exception as e:
+                if logs.sampled("textbox_insert_failed"):
+                    log.warning(
+                        "Textbox insertion also failed: %s (1 in %d logged)",
+                        e,
+                        logs.LOG_SAMPLE_EVERY,
+                    )
+
+    return placement
+
+
 def translate_pdf_bytes_preserve_layout(
-    pdf_bytes: bytes, src_lang: str, tgt_lang: str, fonts_dir: str = "./fonts"
+    pdf_bytes: bytes,
+    src_lang: str,
+    tgt_lang: str,
+    fonts_dir: str = "./fonts",
+    stats: Optional[Dict] = None,
+    glossary_obj=None,
+    translate_batch_fn: Optional[Callable] = None,
 ) -> io.BytesIO:
     """
     Main helper: translates PDF block-by-block preserving layout.
+    Pages whose layout fingerprint matches a previously translated page (same
+    languages and font) are copied from the page store instead of re-translated.
+    glossary_obj (a glossary.Glossary) enforces term translations for every block.
+    If a stats dict is given it is filled with pages_total/pages_reused/pages_recomputed
+    and the placement histogram of the recomputed pages.
+    translate_batch_fn(texts, src_lang, tgt_lang, glossary_obj) defaults to
+    engine.translate_batch, imported on first use.
     Returns io.BytesIO containing the new PDF.
     """
     # Determine font for the target language
@@ -419,23 +850,29 @@ def translate_pdf_bytes_preserve_layout(
     fontfile_uri = None
 
     if fontfile is None:
-        print(
-            f"[doc_translator] WARNING: No font found for '{tgt_lang}' in {fonts_dir}"
-        )
+        log.warning("No font found for '%s' in %s", tgt_lang, fonts_dir)
     else:
-        print(f"[doc_translator] Using font: {fontfile} for {tgt_lang}")
+        log.debug("Using font: %s for %s", fontfile, tgt_lang)
         fontfile_uri = _fontfile_to_file_uri(
             fontfile
         ) or _copy_font_to_temp_and_get_uri(fontfile)
         if fontfile_uri:
-            print(f"[doc_translator] Font URI: {fontfile_uri}")
+            log.debug("Font URI: %s", fontfile_uri)
+
+    if translate_batch_fn is None:
+        translate_batch_fn = _default_translate_batch
 
     doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    store = page_store.store
+    pages_reused = 0
+    pages_recomputed = 0
+    placement = Counter()
 
     # Process each page
     for page_idx in range(len(doc)):
+        # Stop between pages once the request is past its deadline or abandoned
+        admission.raise_if_cancelled()
         page = doc[page_idx]
-        page_rect = page.rect
 
         # Get all images on the page
         image_rects = _get_image_bboxes_from_page(page)
@@ -443,169 +880,64 @@ def translate_pdf_bytes_preserve_layout(
         # Extract text blocks
         blocks = extract_blocks_with_lines(page)
 
-        # Sort blocks by vertical position (top to bottom) for better ordering
-        blocks.sort(key=lambda b: (b["bbox"][1], b["bbox"][0]))
-
-        # Track occupied areas (images + already placed text)
-        occupied_rects = image_rects.copy()
-
-        # Store translated blocks with their placement info
-        translated_placements = []
-
-        for blk_idx, blk in enumerate(blocks):
-            # Build original text from lines
-            original_text = " ".join(line["text"] for line in blk["lines"])
-
-            # Translate the text
-            translated_text = translate_text(original_text, src_lang, tgt_lang)
-
-            if not translated_text.strip():
-                continue
-
-            # Get original font size for consistency
-            original_font_size = blk.get("avg_font_size", 12.0)
-            if original_font_size == 0 or original_font_size < 6:
-                original_font_size = 12.0
-
-            # Use original bbox as starting point
-            original_rect = fitz.Rect(blk["bbox"])
-
-            # Find safe placement that doesn't overlap
-            safe_rect = _find_safe_placement_rect(
-                original_rect, occupied_rects, page_rect, margin=3.0
-            )
-
-            # If a safe rect is found, see if we can expand it a bit to allow larger text
-            if safe_rect is None:
-                print(
-                    f"[doc_translator] Warning: Could not find safe placement for block {blk_idx}, using original position"
-                )
-                safe_rect = original_rect
-
-            # Try to expand available space (so we can fit bigger fonts) while keeping it safe
-            expanded_rect = _expand_rect_to_available_space(
-                safe_rect,
-                occupied_rects,
-                page_rect,
-                max_expand_pixels=80,
-                step=8,
-                margin=3.0,
-            )
-
-            # Add this rect to occupied areas for next blocks (reserve the expanded rect)
-            occupied_rects.append(expanded_rect)
-
-            # Store placement info
-            translated_placements.append(
-                {
-                    "rect": expanded_rect,
-                    "text": translated_text,
-                    "font_size": original_font_size,
-                    "original_rect": original_rect,
-                }
-            )
-
-        # Now redact all original text in one pass
-        for blk in blocks:
-            block_rect = fitz.Rect(blk["bbox"])
-
-            # Check if this block overlaps with any images
-            has_image_overlap = any(
-                _rects_overlap(block_rect, img, margin=0) for img in image_rects
-            )
-
-            if not has_image_overlap:
-                # Safe to redact entire block
-                page.add_redact_annot(block_rect, fill=(1, 1, 1))
-            else:
-                # Redact line by line, avoiding images
-                for line in blk["lines"]:
-                    line_rect = fitz.Rect(line["bbox"])
-                    line_overlaps_image = any(
-                        _rects_overlap(line_rect, img, margin=0) for img in image_rects
-                    )
-
-                    if not line_overlaps_image:
-                        page.add_redact_annot(line_rect, fill=(1, 1, 1))
-
-        # Apply all redactions at once
-        try:
-            page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE)
-        except Exception as e:
-            print(f"[doc_translator] Redaction failed: {e}")
-
-        # Insert all translated text with consistent font sizing
-        for placement in translated_placements:
-            rect = placement["rect"]
-            text = placement["text"]
-            original_fs = placement["font_size"]
-
-            # Count lines in translated text
-            num_lines = max(1, text.count("\n") + 1)
-
-            # Height constraint: give up to ~85% of line-height for font
-            height_per_line = rect.height / num_lines
-            max_fs_by_height = height_per_line * 0.85
-
-            # Width constraint: estimate average characters per line and compute an approximate font size
-            avg_chars_per_line = max(1.0, len(text) / num_lines)
-            # Rough estimate: average character width in points is ~0.5 * fontsize (varies by font). We solve for fs such that avg_chars_per_line * (0.5 * fs) <= rect.width
-            if avg_chars_per_line > 0:
-                max_fs_by_width = (
-                    rect.width / avg_chars_per_line
-                ) * 1.8  # tuned factor
-            else:
-                max_fs_by_width = max_fs_by_height
-
-            # Allow slightly larger than original if space permits but cap it
-            max_allowed_fs = min(24.0, original_fs * 1.4)
-
-            # Start with the lesser of calculated maxima and the allowed cap
-            target_fs = min(max_fs_by_height, max_fs_by_width, max_allowed_fs)
-
-            # Ensure a comfortable minimum for readability
-            target_fs = max(8.0, target_fs)
-
-            # If the rect was expanded then we can try starting a little larger to prefer bigger text
-            start_fs = min(28.0, target_fs * 1.12)
-
-            # Prepare HTML-safe text
-            safe_text = html.escape(text).replace("\n", "<br/>")
-
-            # Try to insert with HTML (it will shrink if needed)
-            success_fs = _insert_html_with_shrink(
-                page,
-                rect,
-                safe_text,
-                fontfile_uri,
-                start_fs=start_fs,
-                min_fs=max(6.0, target_fs * 0.55),
-            )
+        key = (
+            _page_fingerprint(page, blocks, image_rects),
+            src_lang,
+            tgt_lang,
+            os.path.basename(fontfile or ""),
+            glossary_obj.cache_key if glossary_obj is not None else "",
+        )
+        cached = store.get(key) if store.enabled else None
+        if cached is not None:
+            # Unchanged page: show the previously rendered translation
+            _swap_in_page(doc, page_idx, cached)
+            pages_reused += 1
+            continue
 
-            if success_fs == 0:
-                # Fallback to insert_textbox - try with the target_fs (rounded)
-                print(f"[doc_translator] HTML insertion failed, using textbox fallback")
-                try:
-                    # insert_textbox uses 'fontsize' in points; convert to int but keep >=8
-                    textbox_fs = max(8, int(round(target_fs)))
-                    page.insert_textbox(
-                        rect,
-                        text,
-                        fontsize=textbox_fs,
-                        align=0,
-                        overlay=True,
-                    )
-                except Exception as e:
-                    print(f"[doc_translator] Textbox insertion also failed: {e}")
+        page_counts = _translate_page(
+            page,
+            blocks,
+            image_rects,
+            src_lang,
+            tgt_lang,
+            fontfile_uri,
+            glossary_obj,
+            translate_batch_fn,
+        )
+        placement += page_counts
+        # A failed block would otherwise be served from the store until evicted
+        if store.enabled and not page_counts["translation_errors"]:
+            store.put(key, _single_page_pdf_bytes(doc, page_idx))
+        pages_recomputed += 1
+
+    log.info(
+        "PDF translated: %d pages reused, %d recomputed",
+        pages_reused,
+        pages_recomputed,
+        extra={"pages_total": len(doc)},
+    )
+    with _placement_stats_lock:
+        _placement_stats.update(placement)
+    if stats is not None:
+        stats.update(
+            {
+                "pages_total": len(doc),
+                "pages_reused": pages_reused,
+                "pages_recomputed": pages_recomputed,
+                "placement": dict(placement),
+            }
+        )
 
-    # Subset fonts and save
+    # Subset fonts and save; the document is translated in place, so its
+    # outline, labels, forms, layers and attachments are kept as they are
     try:
         doc.subset_fonts()
     except Exception:
         # Not critical
         pass
     out = io.BytesIO()
-    doc.save(out)
+    # Swapped-in pages leave their original contents unreferenced
+    doc.save(out, garbage=1 if pages_reused else 0)
     doc.close()
     out.seek(0)
     return out
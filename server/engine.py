@@ -0,0 +1,566 @@
+# engine.py
+"""
+Translation engine shared by the web servers, the pool workers and the
+command-line translator: device selection, model loading and caching, and
+batched translation. Imports neither Flask nor the audio stack.
+"""
+
+import contextlib
+import gc
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import admission
+import glossary
+import langid
+import standin
+import torch
+import worker_pool
+from IndicTransToolkit.processor import IndicProcessor
+from transformers import (
+    AutoModelForSeq2SeqLM,
+    AutoTokenizer,
+    StoppingCriteriaList,
+    WhisperForConditionalGeneration,
+    WhisperProcessor,
+)
+
+log = logging.getLogger("engine")
+
+
+# ----------------------
+# Device
+# ----------------------
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+log.info("Using device: %s", DEVICE)
+if DEVICE == "cuda":
+    log.info("GPU: %s", torch.cuda.get_device_name(0))
+    log.info("CUDA version: %s", torch.version.cuda)
+
+if standin.STANDIN_MODEL:
+    log.warning(
+        "Using the stand-in translation model (%.0f ms + %.1f ms/token)",
+        standin.STANDIN_LATENCY_MS,
+        standin.STANDIN_MS_PER_TOKEN,
+    )
+
+# Model paths
+WHISPER_MODEL = "./models/whisper-medium"
+MODEL_PATH_EN_INDIC = "./models/indictrans2-en-indic-1B"
+MODEL_PATH_INDIC_EN = "./models/indictrans2-indic-en-1B"
+
+# ----------------------
+# Language codes
+# ----------------------
+LANG_CODES = {
+    "Assamese": "asm_Beng",
+    "Bengali": "ben_Beng",
+    "English": "eng_Latn",
+    "Gujarati": "guj_Gujr",
+    "Hindi": "hin_Deva",
+    "Kannada": "kan_Knda",
+    "Malayalam": "mal_Mlym",
+    "Marathi": "mar_Deva",
+    "Nepali": "npi_Deva",
+    "Odia": "ory_Orya",
+    "Punjabi": "pan_Guru",
+    "Sanskrit": "san_Deva",
+    "Tamil": "tam_Taml",
+    "Telugu": "tel_Telu",
+    "Urdu": "urd_Arab",
+    "Kashmiri": "kas_Arab",
+    "Maithili": "mai_Deva",
+    "Sindhi": "snd_Arab",
+    "Bodo": "brx_Deva",
+    "Dogri": "doi_Deva",
+    "Konkani": "kok_Deva",
+    "Manipuri": "mni_Beng",
+    "Santali": "sat_Olck",
+}
+language_id = langid.LanguageIdentifier(LANG_CODES)
+
+
+# ----------------------
+# Model loading options
+# ----------------------
+# FAST_LOAD=1: memory-map safetensors checkpoints and load with low_cpu_mem_usage
+FAST_LOAD = os.environ.get("FAST_LOAD", "1") == "1"
+# CPU_BF16=0|auto|1: translation weights stay float32 on CPU by default. Opt in
+# with "auto" (bfloat16 on CPUs with native bf16) or "1" (always bfloat16);
+# bfloat16 output can differ slightly from float32, so check quality first.
+CPU_BF16 = os.environ.get("CPU_BF16", "0").lower()
+
+
+def _cpu_supports_bf16() -> bool:
+    """True if the CPU advertises native bfloat16 support (AVX512-BF16, AMX or ARM BF16)."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = set(f.read().split())
+    except OSError:
+        return False
+    return bool(flags & {"avx512_bf16", "amx_bf16", "bf16"})
+
+
+def _translation_dtype() -> torch.dtype:
+    if DEVICE == "cuda":
+        return torch.float16
+    if CPU_BF16 == "1" or (CPU_BF16 == "auto" and _cpu_supports_bf16()):
+        return torch.bfloat16
+    return torch.float32
+
+
+def _has_safetensors(model_path: str) -> bool:
+    try:
+        return any(name.endswith(".safetensors") for name in os.listdir(model_path))
+    except OSError:
+        return False
+
+
+def _read_status_kb(field: str) -> int:
+    """Read a VmRSS/VmHWM style field (in kB) from /proc/self/status, 0 if unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _reset_peak_rss():
+    """Reset the kernel's RSS high-water mark so the next peak is per-load (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+# ----------------------
+# Model cache
+# ----------------------
+class ModelCache:
+    def __init__(self):
+        self.whisper_processor: Optional[WhisperProcessor] = None
+        self.whisper_model: Optional[WhisperForConditionalGeneration] = None
+
+        self.tok_en_indic: Optional[AutoTokenizer] = None
+        self.model_en_indic: Optional[AutoModelForSeq2SeqLM] = None
+        self.tok_indic_en: Optional[AutoTokenizer] = None
+        self.model_indic_en: Optional[AutoModelForSeq2SeqLM] = None
+        self.indic_processor: Optional[IndicProcessor] = None
+
+        # name -> {load_seconds, peak_rss_mb, rss_delta_mb, dtype, fast_load, loads}
+        self.load_stats: Dict[str, Dict] = {}
+        # direction -> ballast held by the stand-in model (STANDIN_MODEL=1)
+        self.standin_weights: Dict[str, bytes] = {}
+        # Streams holding the translation models loaded (see pin_translation)
+        self._translation_pins = 0
+        self._pin_lock = threading.Lock()
+
+    def _load_pretrained(self, name, model_cls, model_path, dtype, **kwargs):
+        """
+        Load model weights, memory-mapping safetensors with low_cpu_mem_usage when
+        FAST_LOAD is on, and record load time / peak RSS under load_stats[name].
+        """
+        _reset_peak_rss()
+        rss_before = _read_status_kb("VmRSS")
+        t0 = time.perf_counter()
+
+        kwargs.update(local_files_only=True, dtype=dtype)
+        if FAST_LOAD:
+            kwargs["low_cpu_mem_usage"] = True
+            if _has_safetensors(model_path):
+                kwargs["use_safetensors"] = True
+            if DEVICE == "cuda":
+                # Materialize weights directly on the GPU instead of CPU then .to()
+                kwargs["device_map"] = DEVICE
+        model = model_cls.from_pretrained(model_path, **kwargs)
+        if model.device.type != DEVICE:
+            model = model.to(DEVICE)
+
+        load_seconds = time.perf_counter() - t0
+        peak_kb = _read_status_kb("VmHWM")
+        previous = self.load_stats.get(name, {})
+        self.load_stats[name] = {
+            "load_seconds": round(load_seconds, 3),
+            "peak_rss_mb": round(peak_kb / 1024, 1),
+            "rss_delta_mb": round((_read_status_kb("VmRSS") - rss_before) / 1024, 1),
+            "dtype": str(dtype).replace("torch.", ""),
+            "fast_load": FAST_LOAD,
+            "loads": previous.get("loads", 0) + 1,
+        }
+        log.info(
+            "%s loaded in %.2fs (peak RSS %.0f MB, dtype %s)",
+            name,
+            load_seconds,
+            peak_kb / 1024,
+            self.load_stats[name]["dtype"],
+        )
+        return model
+
+    # ------------- Whisper -------------
+    def load_whisper(self):
+        if self.whisper_processor is None or self.whisper_model is None:
+            log.info("Loading Whisper-Medium model...")
+            self.whisper_processor = WhisperProcessor.from_pretrained(
+                WHISPER_MODEL, local_files_only=True
+            )
+            self.whisper_model = self._load_pretrained(
+                "whisper",
+                WhisperForConditionalGeneration,
+                WHISPER_MODEL,
+                torch.float16 if DEVICE == "cuda" else torch.float32,
+            )
+            log.info("Whisper model loaded on %s", DEVICE)
+        return self.whisper_processor, self.whisper_model
+
+    def unload_whisper(self):
+        if self.whisper_model is not None:
+            log.info("Unloading Whisper model...")
+            del self.whisper_model
+            del self.whisper_processor
+            self.whisper_model = None
+            self.whisper_processor = None
+        gc.collect()
+        if DEVICE == "cuda":
+            torch.cuda.empty_cache()
+        log.info("Whisper model unloaded.")
+
+    # ------------- Translation -------------
+    def load_translation_models(self, direction):
+        if standin.STANDIN_MODEL:
+            if direction not in self.standin_weights:
+                self.standin_weights[direction] = standin.load_weights()
+                log.info("Stand-in %s model loaded", direction)
+            return None, None, None
+
+        if self.indic_processor is None:
+            log.info("Loading IndicProcessor...")
+            self.indic_processor = IndicProcessor(inference=True)
+
+        if direction == "en_to_indic":
+            if self.tok_en_indic is None or self.model_en_indic is None:
+                log.info("Loading EN→Indic translation model...")
+                self.tok_en_indic = AutoTokenizer.from_pretrained(
+                    MODEL_PATH_EN_INDIC, local_files_only=True, trust_remote_code=True
+                )
+                self.model_en_indic = self._load_pretrained(
+                    "en_to_indic",
+                    AutoModelForSeq2SeqLM,
+                    MODEL_PATH_EN_INDIC,
+                    _translation_dtype(),
+                    trust_remote_code=True,
+                )
+                assert self.model_en_indic is not None, "Model did not load correctly!"
+                log.info("EN→Indic model loaded on %s", DEVICE)
+            return self.tok_en_indic, self.model_en_indic, self.indic_processor
+
+        elif direction == "indic_to_en":
+            if self.tok_indic_en is None or self.model_indic_en is None:
+                log.info("Loading Indic→EN translation model...")
+                self.tok_indic_en = AutoTokenizer.from_pretrained(
+                    MODEL_PATH_INDIC_EN, local_files_only=True, trust_remote_code=True
+                )
+                self.model_indic_en = self._load_pretrained(
+                    "indic_to_en",
+                    AutoModelForSeq2SeqLM,
+                    MODEL_PATH_INDIC_EN,
+                    _translation_dtype(),
+                    trust_remote_code=True,
+                )
+                assert self.model_indic_en is not None, "Model did not load correctly!"
+                log.info("Indic→EN model loaded on %s", DEVICE)
+            return self.tok_indic_en, self.model_indic_en, self.indic_processor
+
+    @contextlib.contextmanager
+    def pin_translation(self):
+        """Keep the translation models loaded (unloading is skipped) inside the block."""
+        with self._pin_lock:
+            self._translation_pins += 1
+        try:
+            yield
+        finally:
+            with self._pin_lock:
+                self._translation_pins -= 1
+
+    def unload_translation(self):
+        """Free the translation models, unless a stream has them pinned."""
+        with self._pin_lock:
+            if self._translation_pins:
+                log.debug(
+                    "Translation models pinned by %d streams; not unloading",
+                    self._translation_pins,
+                )
+                return
+            self._unload_translation()
+
+    def _unload_translation(self):
+        self.standin_weights.clear()
+        if self.model_en_indic:
+            del self.model_en_indic, self.tok_en_indic
+            self.model_en_indic = None
+            self.tok_en_indic = None
+        if self.model_indic_en:
+            del self.model_indic_en, self.tok_indic_en
+            self.model_indic_en = None
+            self.tok_indic_en = None
+        if self.indic_processor:
+            del self.indic_processor
+            self.indic_processor = None
+        gc.collect()
+        if DEVICE == "cuda":
+            torch.cuda.empty_cache()
+        log.info("Translation models unloaded.")
+
+
+cache = ModelCache()
+
+
+# ----------------------
+# Helpers
+# ----------------------
+def normalize_lang(lang):
+    return LANG_CODES.get(lang, lang)
+
+
+def translation_direction(src_code, tgt_code) -> Optional[str]:
+    """Model direction for a code pair, or None when it must pivot through English."""
+    if src_code.startswith("eng") and not tgt_code.startswith("eng"):
+        return "en_to_indic"
+    if not src_code.startswith("eng") and tgt_code.startswith("eng"):
+        return "indic_to_en"
+    return None
+
+
+def generate_batch(
+    texts: List[str], src_lang, tgt_lang, gen_stats: Optional[Dict] = None
+) -> List[str]:
+    """
+    Translate a batch of texts for a direct EN→Indic / Indic→EN pair in this process.
+    Raises on failure. If gen_stats is given, output_tokens is added to it.
+    """
+    src_code = LANG_CODES[src_lang]
+    tgt_code = LANG_CODES[tgt_lang]
+    direction = translation_direction(src_code, tgt_code)
+    if direction is None:
+        raise ValueError(f"No direct model for {src_lang} → {tgt_lang}")
+
+    # Load processor & model
+    tok, model, ip = cache.load_translation_models(direction)
+    if standin.STANDIN_MODEL:
+        decoded, n_tokens = standin.generate(
+            texts, tgt_code, check=admission.raise_if_cancelled
+        )
+        if gen_stats is not None:
+            gen_stats["output_tokens"] = gen_stats.get("output_tokens", 0) + n_tokens
+        return decoded
+
+    # Put model in eval and disable caching to avoid past_key_values issues
+    model.eval()
+    # Ensure both config and runtime generation request use_cache=False
+    try:
+        model.config.use_cache = False
+    except Exception:
+        # some model wrappers might not have config; ignore if not present
+        pass
+
+    # Preprocess
+    if ip:
+        batch = ip.preprocess_batch(texts, src_lang=src_code, tgt_lang=tgt_code)
+    else:
+        batch = texts
+
+    # Build inputs
+    if isinstance(batch, dict):
+        inputs = {}
+        for k, v in batch.items():
+            if isinstance(v, torch.Tensor):
+                inputs[k] = v.to(DEVICE)
+            else:
+                try:
+                    inputs[k] = torch.tensor(v, device=DEVICE)
+                except Exception:
+                    continue
+    else:
+        enc = tok(
+            batch,
+            truncation=True,
+            padding="longest",
+            return_tensors="pt",
+            return_attention_mask=True,
+            max_length=256,
+        )
+        inputs = {
+            k: v.to(DEVICE) for k, v in enc.items() if isinstance(v, torch.Tensor)
+        }
+
+    # Sanity: must have input_ids
+    if "input_ids" not in inputs or inputs["input_ids"] is None:
+        raise RuntimeError(
+            "tokenizer/processor did not return 'input_ids'. Check input types and processor output."
+        )
+
+    # Ensure tensors are on the same device as the model
+    model_device = next(model.parameters()).device
+    for k, v in list(inputs.items()):
+        if isinstance(v, torch.Tensor):
+            inputs[k] = v.to(model_device)
+
+    gen_kwargs = {
+        "input_ids": inputs.get("input_ids"),
+        # explicitly disable use_cache to avoid past_key_values access in forward
+        "use_cache": False,
+        # safe defaults:
+        "num_beams": 5,
+        "max_length": 256,
+        "num_return_sequences": 1,
+    }
+    if inputs.get("attention_mask") is not None:
+        gen_kwargs["attention_mask"] = inputs.get("attention_mask")
+    # Stop beam search early if the request is cancelled mid-generation
+    cancel_criteria = admission.make_stopping_criteria()
+    if cancel_criteria is not None:
+        gen_kwargs["stopping_criteria"] = StoppingCriteriaList([cancel_criteria])
+
+    admission.raise_if_cancelled()
+    with torch.no_grad():
+        outputs = model.generate(**gen_kwargs)
+    # Outputs of a cancelled generate are truncated; never return them
+    admission.raise_if_cancelled()
+
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(
+            "generate outputs shape %s: %s",
+            tuple(getattr(outputs, "shape", ())),
+            outputs,
+        )
+
+    if gen_stats is not None:
+        if tok.pad_token_id is not None:
+            n_tokens = int((outputs != tok.pad_token_id).sum().item())
+        else:
+            n_tokens = int(outputs.numel())
+        gen_stats["output_tokens"] = gen_stats.get("output_tokens", 0) + n_tokens
+
+    decoded = tok.batch_decode(outputs, skip_special_tokens=True)
+    if ip:
+        decoded = ip.postprocess_batch(decoded, lang=tgt_code)
+    return decoded
+
+
+def translate_batch(
+    texts: List[str],
+    src_lang,
+    tgt_lang,
+    glossary_obj: Optional[glossary.Glossary] = None,
+    gen_stats: Optional[Dict] = None,
+    detect: bool = True,
+) -> List[str]:
+    """
+    Translate a batch of texts, relaying Indic→Indic through English.
+    Runs on the worker pool when one is configured, otherwise inline.
+    src_lang may be "auto"; with detect, texts whose detected language differs
+    from src_lang are translated from the detected language instead.
+    Glossary terms are swapped for placeholders before translation and replaced
+    with their target forms afterwards.
+    If gen_stats is given, generated output_tokens are added to it.
+    Failed batches yield "[Translation Error]" for every text.
+    """
+    if not texts:
+        return []
+    if detect:
+        sources = language_id.source_languages(texts, src_lang)
+        if any(src != src_lang for src in sources):
+            return _translate_by_source(
+                texts, sources, tgt_lang, glossary_obj, gen_stats
+            )
+    if src_lang == tgt_lang or src_lang == langid.AUTO:
+        # Nothing to translate (or, for "auto", no letters to detect a language from)
+        return list(texts)
+    if glossary_obj is not None and glossary_obj.applies_to(src_lang, tgt_lang):
+        protected, replacements = glossary.protect_terms(texts, glossary_obj)
+        translated = translate_batch(
+            protected, src_lang, tgt_lang, gen_stats=gen_stats, detect=False
+        )
+        restored, lost = glossary.restore_terms(translated, replacements)
+        lost = [i for i in lost if translated[i] != "[Translation Error]"]
+        if lost:
+            # The model dropped a placeholder; a translation without the glossary
+            # beats one with a term missing
+            log.warning(
+                "Glossary %s: placeholders lost in %d of %d texts, "
+                "translating those without it",
+                glossary_obj.cache_key,
+                len(lost),
+                len(texts),
+            )
+            retried = translate_batch(
+                [texts[i] for i in lost],
+                src_lang,
+                tgt_lang,
+                gen_stats=gen_stats,
+                detect=False,
+            )
+            for i, text in zip(lost, retried):
+                restored[i] = text
+        return restored
+
+    src_code = LANG_CODES[src_lang]
+    tgt_code = LANG_CODES[tgt_lang]
+
+    direction = translation_direction(src_code, tgt_code)
+    if direction is None:
+        # Indic→Indic: relay via English
+        mid = translate_batch(
+            texts, src_lang, "English", gen_stats=gen_stats, detect=False
+        )
+        return translate_batch(
+            mid, "English", tgt_lang, gen_stats=gen_stats, detect=False
+        )
+
+    try:
+        pool = worker_pool.get_pool()
+        if pool is not None and pool.serves(direction):
+            return pool.translate(texts, src_lang, tgt_lang, direction, gen_stats)
+        return generate_batch(texts, src_lang, tgt_lang, gen_stats)
+
+    except admission.RequestCancelled:
+        raise
+    except Exception:
+        log.exception("IndicTrans2 translation failed (%d texts)", len(texts))
+        return ["[Translation Error]"] * len(texts)
+
+
+def _translate_by_source(texts, sources, tgt_lang, glossary_obj, gen_stats):
+    """Translate texts grouped by their detected source language, keeping order."""
+    groups = defaultdict(list)
+    for i, src in enumerate(sources):
+        groups[src].append(i)
+    log.debug("Detected source languages: %s", {k: len(v) for k, v in groups.items()})
+    out: List[str] = [""] * len(texts)
+    for src, indices in groups.items():
+        translated = translate_batch(
+            [texts[i] for i in indices],
+            src,
+            tgt_lang,
+            glossary_obj,
+            gen_stats,
+            detect=False,
+        )
+        for i, text in zip(indices, translated):
+            out[i] = text
+    return out
+
+
+def translate_text(text, src_lang, tgt_lang, glossary_obj=None):
+    log.debug("Translating %r from %s → %s", text, src_lang, tgt_lang)
+
+    translated = translate_batch([text], src_lang, tgt_lang, glossary_obj)[0]
+    log.debug("Translation: %r", translated)
+    return translated
@@ -0,0 +1,328 @@
+# glossary.py
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# ----------------------
+# Configuration
+# ----------------------
+# Number of compiled glossary automata kept in memory
+GLOSSARY_CACHE_SIZE = int(os.environ.get("GLOSSARY_CACHE_SIZE", "8"))
+# Total automaton states kept in that cache (roughly 110 bytes each); the most
+# recently used glossary stays compiled even if it alone is larger
+GLOSSARY_CACHE_MAX_STATES = int(os.environ.get("GLOSSARY_CACHE_MAX_STATES", "2000000"))
+# Limits on one glossary; the automaton is built while the PUT request waits
+GLOSSARY_MAX_TERMS = int(os.environ.get("GLOSSARY_MAX_TERMS", "50000"))
+# Total length of the source terms, which bounds the number of states
+GLOSSARY_MAX_CHARS = int(os.environ.get("GLOSSARY_MAX_CHARS", "1000000"))
+
+# Placeholder written into the source text in place of a glossary term.
+# Distinct from IndicProcessor's own <IDn> placeholders so the two never collide.
+PLACEHOLDER = "<GLS{}>"
+# Tolerate the spacing/bracket variants the model sometimes emits
+_PLACEHOLDER_RE = re.compile(r"[<\[]\s*GLS\s*(\d+)\s*[>\]]")
+
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher. Construction is linear in the total pattern
+    length and a search is linear in the text length plus the number of matches,
+    independent of how many patterns there are.
+
+    The automaton is flat: one dict of transitions keyed by state and code point
+    plus int arrays per state, rather than a dict and a list per state, which
+    keeps a large glossary to a fraction of the memory.
+    """
+
+    def __init__(self, patterns: List[str]):
+        # _goto[state << 21 | ord(ch)] is the next state; state 0 is the root
+        self._goto: Dict[int, int] = {}
+        self._fail = array("i", [0])
+        # Index of the pattern ending at a state, or -1
+        self._match = array("i", [-1])
+        # Nearest state on the failure chain where a pattern ends (0: none)
+        self._next_match = array("i", [0])
+        self._lengths = [len(p) for p in patterns]
+        parent = array("i", [0])
+        label = array("i", [0])
+        depth = array("i", [0])
+
+        goto = self._goto
+        for idx, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                key = state << 21 | ord(ch)
+                nxt = goto.get(key)
+                if nxt is None:
+                    nxt = len(self._fail)
+                    goto[key] = nxt
+                    self._fail.append(0)
+                    self._match.append(-1)
+                    self._next_match.append(0)
+                    parent.append(state)
+                    label.append(ord(ch))
+                    depth.append(depth[state] + 1)
+                state = nxt
+            if self._match[state] < 0:
+                self._match[state] = idx
+
+        # Failure links in breadth-first order, so every parent's link is set first
+        fail, match, next_match = self._fail, self._match, self._next_match
+        for state in sorted(range(1, len(fail)), key=depth.__getitem__):
+            if depth[state] == 1:
+                continue
+            code = label[state]
+            f = fail[parent[state]]
+            while f and (f << 21 | code) not in goto:
+                f = fail[f]
+            f = goto.get(f << 21 | code, 0)
+            fail[state] = f
+            next_match[state] = f if match[f] >= 0 else next_match[f]
+
+    @property
+    def num_states(self) -> int:
+        return len(self._fail)
+
+    def iter_matches(self, text: str):
+        """Yield (start, end, pattern_index) for every occurrence in text."""
+        goto, fail, lengths = self._goto, self._fail, self._lengths
+        match, next_match = self._match, self._next_match
+        state = 0
+        for i, ch in enumerate(text):
+            code = ord(ch)
+            while state and (state << 21 | code) not in goto:
+                state = fail[state]
+            state = goto.get(state << 21 | code, 0)
+            out = state if match[state] >= 0 else next_match[state]
+            while out:
+                idx = match[out]
+                yield i + 1 - lengths[idx], i + 1, idx
+                out = next_match[out]
+
+
+def _is_word_char(ch: str) -> bool:
+    # Combining marks (Indic vowel signs, viramas) continue the current word
+    return ch.isalnum() or ch == "_" or unicodedata.category(ch).startswith("M")
+
+
+class Glossary:
+    """A named, versioned source→target term list for one language pair."""
+
+    def __init__(
+        self,
+        name: str,
+        src_lang: str,
+        tgt_lang: str,
+        entries: Dict[str, str],
+        version: int = 1,
+        case_sensitive: bool = False,
+    ):
+        self.name = name
+        self.src_lang = src_lang
+        self.tgt_lang = tgt_lang
+        self.entries = {s.strip(): t for s, t in entries.items() if s and s.strip()}
+        self.version = version
+        self.case_sensitive = case_sensitive
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+    def applies_to(self, src_lang: str, tgt_lang: str) -> bool:
+        return self.src_lang == src_lang and self.tgt_lang == tgt_lang
+
+    def describe(self) -> Dict:
+        return {
+            "name": self.name,
+            "src_lang": self.src_lang,
+            "tgt_lang": self.tgt_lang,
+            "version": self.version,
+            "entries": len(self.entries),
+            "case_sensitive": self.case_sensitive,
+        }
+
+
+class _CompiledGlossary:
+    def __init__(self, glossary: Glossary):
+        self.sources = list(glossary.entries)
+        self.targets = [glossary.entries[s] for s in self.sources]
+        self.case_sensitive = glossary.case_sensitive
+        patterns = (
+            self.sources if self.case_sensitive else [s.lower() for s in self.sources]
+        )
+        self.matcher = AhoCorasick(patterns)
+
+    def find(self, text: str) -> List[Tuple[int, int, int]]:
+        """Leftmost-longest, non-overlapping whole-word matches in text."""
+        haystack = text
+        if not self.case_sensitive:
+            lowered = text.lower()
+            # lower() can change length for a few characters; offsets must line up
+            if len(lowered) == len(text):
+                haystack = lowered
+        matches = []
+        for start, end, idx in self.matcher.iter_matches(haystack):
+            if (
+                start > 0
+                and _is_word_char(text[start - 1])
+                and _is_word_char(text[start])
+            ):
+                continue
+            if (
+                end < len(text)
+                and _is_word_char(text[end])
+                and _is_word_char(text[end - 1])
+            ):
+                continue
+            matches.append((start, end, idx))
+        matches.sort(key=lambda m: (m[0], m[0] - m[1]))
+        selected = []
+        last_end = 0
+        for start, end, idx in matches:
+            if start >= last_end:
+                selected.append((start, end, idx))
+                last_end = end
+        return selected
+
+
+class GlossaryStore:
+    """Registered glossaries plus an LRU cache of automata compiled per glossary version."""
+
+    def __init__(
+        self,
+        cache_size: int = GLOSSARY_CACHE_SIZE,
+        cache_max_states: int = GLOSSARY_CACHE_MAX_STATES,
+    ):
+        self._glossaries: Dict[str, Glossary] = {}
+        # Last version handed out per name; kept across deletes so a re-created
+        # glossary never reuses a cache_key (compiled automata, stored pages)
+        self._versions: Dict[str, int] = {}
+        self._compiled: "OrderedDict[str, _CompiledGlossary]" = OrderedDict()
+        self._cache_size = max(1, cache_size)
+        self._cache_max_states = cache_max_states
+        self._cached_states = 0
+        self._lock = threading.Lock()
+
+    def put(
+        self,
+        name: str,
+        src_lang: str,
+        tgt_lang: str,
+        entries: Dict[str, str],
+        case_sensitive: bool = False,
+    ) -> Glossary:
+        """Register (or replace) a glossary; raises ValueError past the size limits."""
+        terms = [s for s in entries if s and s.strip()]
+        if len(terms) > GLOSSARY_MAX_TERMS:
+            raise ValueError(
+                f"Glossary has {len(terms)} terms (limit {GLOSSARY_MAX_TERMS})"
+            )
+        chars = sum(len(s) for s in terms)
+        if chars > GLOSSARY_MAX_CHARS:
+            raise ValueError(
+                f"Glossary terms total {chars} characters (limit {GLOSSARY_MAX_CHARS})"
+            )
+        with self._lock:
+            version = self._versions.get(name, 0) + 1
+            self._versions[name] = version
+            glossary = Glossary(
+                name, src_lang, tgt_lang, entries, version, case_sensitive
+            )
+            self._glossaries[name] = glossary
+        # Compile eagerly so the first request using it does not pay for it
+        self.compiled(glossary)
+        return glossary
+
+    def get(self, name: str) -> Optional[Glossary]:
+        return self._glossaries.get(name)
+
+    def delete(self, name: str) -> bool:
+        with self._lock:
+            if self._glossaries.pop(name, None) is None:
+                return False
+            for key in [k for k in self._compiled if k.rpartition("@")[0] == name]:
+                self._cached_states -= self._compiled.pop(key).matcher.num_states
+            return True
+
+    def list(self) -> List[Dict]:
+        return [g.describe() for g in self._glossaries.values()]
+
+    def compiled(self, glossary: Glossary) -> _CompiledGlossary:
+        key = glossary.cache_key
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+                return compiled
+        compiled = _CompiledGlossary(glossary)
+        with self._lock:
+            if key not in self._compiled:
+                self._compiled[key] = compiled
+                self._cached_states += compiled.matcher.num_states
+            while len(self._compiled) > 1 and (
+                len(self._compiled) > self._cache_size
+                or self._cached_states > self._cache_max_states
+            ):
+                _, evicted = self._compiled.popitem(last=False)
+                self._cached_states -= evicted.matcher.num_states
+        return compiled
+
+
+store = GlossaryStore()
+
+
+def protect_terms(
+    texts: List[str], glossary: Glossary
+) -> Tuple[List[str], List[List[str]]]:
+    """
+    Replace glossary source terms with placeholders before translation.
+    Returns the protected texts and, per text, the target forms indexed by placeholder number.
+    """
+    compiled = store.compiled(glossary)
+    protected, replacements = [], []
+    for text in texts:
+        targets = []
+        parts = []
+        pos = 0
+        for start, end, idx in compiled.find(text):
+            parts.append(text[pos:start])
+            parts.append(PLACEHOLDER.format(len(targets)))
+            targets.append(compiled.targets[idx])
+            pos = end
+        if targets:
+            parts.append(text[pos:])
+            text = "".join(parts)
+        protected.append(text)
+        replacements.append(targets)
+    return protected, replacements
+
+
+def restore_terms(
+    texts: List[str], replacements: List[List[str]]
+) -> Tuple[List[str], List[int]]:
+    """
+    Put the glossary target forms back in place of their placeholders.
+    Returns the restored texts and the indices of texts whose translation lost,
+    or garbled, one of its placeholders; those terms would be silently missing.
+    """
+    restored, lost = [], []
+    for i, (text, targets) in enumerate(zip(texts, replacements)):
+        if targets:
+            seen = set()
+
+            def _sub(m, targets=targets, seen=seen):
+                n = int(m.group(1))
+                seen.add(n)
+                return targets[n] if n < len(targets) else m.group(0)
+
+            text = _PLACEHOLDER_RE.sub(_sub, text)
+            if seen != set(range(len(targets))):
+                lost.append(i)
+        restored.append(text)
+    return restored, lost
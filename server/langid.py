@@ -0,0 +1,273 @@
+# langid.py
+"""
+Script-based language identification for routing translations.
+
+Texts are classified by the Unicode script most of their letters belong to,
+counted for a whole batch at once with numpy. Scripts used by a single supported
+language decide directly; for scripts shared by several (Devanagari, Bengali,
+Arabic) a small weighted character n-gram profile picks among them, unless the
+caller's requested language already uses that script.
+"""
+
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+from glossary import AhoCorasick
+
+# ----------------------
+# Configuration
+# ----------------------
+# Translate from the detected language when the text is not in the requested
+# language's script (0 = only detect when the source is "auto")
+LANGID_OVERRIDE = os.environ.get("LANGID_OVERRIDE", "1") == "1"
+# Characters of a text scanned by the n-gram profiles
+LANGID_NGRAM_CHARS = int(os.environ.get("LANGID_NGRAM_CHARS", "256"))
+# Optional JSON file {script: {language: {ngram: weight}}} merged over the built-in profiles
+LANGID_PROFILES = os.environ.get("LANGID_PROFILES", "")
+
+# Source language value that asks for detection
+AUTO = "auto"
+
+# Script code (as used in LANG_CODES) -> code point ranges
+SCRIPT_RANGES = {
+    "Latn": [(0x41, 0x5A), (0x61, 0x7A), (0xC0, 0x24F), (0x1E00, 0x1EFF)],
+    "Deva": [(0x900, 0x97F), (0xA8E0, 0xA8FF)],
+    "Beng": [(0x980, 0x9FF)],
+    "Guru": [(0xA00, 0xA7F)],
+    "Gujr": [(0xA80, 0xAFF)],
+    "Orya": [(0xB00, 0xB7F)],
+    "Taml": [(0xB80, 0xBFF)],
+    "Telu": [(0xC00, 0xC7F)],
+    "Knda": [(0xC80, 0xCFF)],
+    "Mlym": [(0xD00, 0xD7F)],
+    "Arab": [
+        (0x600, 0x6FF),
+        (0x750, 0x77F),
+        (0x8A0, 0x8FF),
+        (0xFB50, 0xFDFF),
+        (0xFE70, 0xFEFF),
+    ],
+    "Olck": [(0x1C50, 0x1C7F)],
+    "Mtei": [(0xABC0, 0xABFF)],
+}
+# Scripts with no LANG_CODES entry of their own
+EXTRA_SCRIPT_LANGS = {"Mtei": "Manipuri"}
+# Digits, signs and punctuation inside the script blocks that say nothing on their own
+_NEUTRAL = [(0x964, 0x96F), (0x9E6, 0x9EF), (0x660, 0x669), (0x6F0, 0x6F9)]
+
+# Weighted character n-grams for languages that share a script. A leading or
+# trailing space marks a word boundary. The first language of each script is
+# the default when nothing matches.
+# fmt: off
+PROFILES: Dict[str, Dict[str, Dict[str, float]]] = {
+    "Deva": {
+        "Hindi": {
+            " है": 2, " हैं": 2, " के ": 1, " की ": 1, " में ": 1.5, " और ": 1.5,
+            " का ": 1, " से ": 0.5, " नहीं": 1.5, " यह ": 1, " था": 1, " थी": 1,
+            " गया": 1, " रहा": 1, " लिए": 1, " किया": 1.5, " को ": 0.5,
+        },
+        "Marathi": {
+            " आहे": 3, " आणि": 3, "च्या": 2, "ळ": 1, " नाही": 2, " होते": 1.5,
+            " मध्ये": 2, " केले": 1.5, " हे ": 1, " व ": 1, "ला ": 0.5,
+            "ने ": 0.3, " त्या": 1.5, "ल्या": 1,
+        },
+        "Nepali": {
+            " छ ": 2, "छन्": 2, " हो ": 1, " र ": 1.5, "को ": 1, "मा ": 1,
+            " गर्": 2, " पनि": 2, "हरू": 3, " भएको": 2.5, " थियो": 3, " यो ": 1.5,
+            "ेको ": 1.5, " छ": 1,
+        },
+        "Sanskrit": {
+            "ः": 1.5, "स्य ": 2, " अस्ति": 3, " च ": 1.5, "ानि ": 1, " इति": 2.5,
+            "ाय ": 1, "ेन ": 1.5, "म् ": 1.5, "न्ति ": 2, " तत्": 2, "ानाम्": 3,
+        },
+        "Maithili": {
+            " अछि": 3, " छल": 2, " छथि": 3, " सँ ": 2, " ई ": 1, " जे ": 1,
+            " ओ ": 1, "क ": 0.3, " कएल": 2.5, " छैक": 2.5,
+        },
+        "Bodo": {
+            " आरो": 3, " नाय": 2, "जों": 2, "खौ": 2.5, "फ्राय": 2.5, "आव ": 2,
+            "थाय": 1.5, "नो ": 1, " मोन": 1, "सिम": 1, "गोनां": 2.5, " जादों": 3,
+        },
+        "Dogri": {
+            " ऐ ": 2.5, " दा ": 1.5, " दी ": 1.5, " दे ": 1.5, " ते ": 1.5,
+            " नेईं": 3, " एह् ": 2, " कन्नै": 3, " गी ": 2, " च ": 0.5,
+            " होई": 1, "ंदा ": 1.5,
+        },
+        "Konkani": {
+            " आसा": 3, " आनी": 3, " हांव": 3, "ांक": 1.5, " जाल्यार": 2,
+            "चो ": 1.5, "चें": 2, " ना ": 1, "ळ": 0.5, " तुमी": 2, " केल्लें": 3,
+        },
+    },
+    "Beng": {
+        "Bengali": {
+            " এবং": 2, " করে": 1, " হয়": 1, " আমি": 1, "টি ": 1, "গুলো": 2,
+            " না ": 0.5, "ছে ": 0.5, " আমার": 1, " করা": 1, " থেকে": 1.5,
+        },
+        "Assamese": {
+            "ৰ": 3, "ৱ": 3, " আৰু": 3, " নহয়": 2, "বোৰ": 2, "টো ": 1.5,
+            " কৰি": 2, " হৈছে": 2,
+        },
+        "Manipuri": {
+            " অমসুং": 3, "গী ": 2, "দা ": 1.5, "খি ": 1.5, " মহাক": 2, "ঙ": 0.8,
+            "বনি": 1.5, "শিং": 2, " অদু": 2, "রক্লে": 2.5,
+        },
+    },
+    "Arab": {
+        "Urdu": {
+            "ے": 1, "ں": 1, "ٹ": 1, "ڈ": 1, "ڑ": 1.5, "ھ": 0.5, " ہے": 2,
+            " کے ": 1, " میں ": 1, " اور ": 1.5, " کی ": 1, " نہیں": 1.5,
+        },
+        "Sindhi": {
+            "ڄ": 3, "ڃ": 3, "ڇ": 3, "ڊ": 3, "ڏ": 3, "ڍ": 3, "ٻ": 3, "ٽ": 3,
+            "ٿ": 3, "ڦ": 3, "ڪ": 3, "ڱ": 3, "ڻ": 3, " ۾ ": 3, " آهي": 3,
+        },
+        "Kashmiri": {
+            "ٲ": 3, "ٳ": 3, "ۆ": 2, "ێ": 2, "ۄ": 3, "ۍ": 3, "ٕ": 2, " چھ": 2,
+            " تہٕ": 3,
+        },
+    },
+}
+# fmt: on
+
+# Sentence punctuation mapped to spaces so word-boundary n-grams still match
+_BOUNDARY_CHARS = "।॥,.;:!?\"'()[]{}\n\t\r-–—،؟۔"
+_TO_SPACE = str.maketrans({c: " " for c in _BOUNDARY_CHARS})
+
+
+class _Profile:
+    """All n-grams of one script's languages, matched in a single pass."""
+
+    def __init__(self, langs: Dict[str, Dict[str, float]]):
+        self.langs = list(langs)
+        weights: Dict[str, Dict[int, float]] = {}
+        for li, lang in enumerate(self.langs):
+            for ngram, weight in langs[lang].items():
+                weights.setdefault(ngram, {})[li] = weight
+        self.ngrams = list(weights)
+        self.weights = [list(weights[g].items()) for g in self.ngrams]
+        self.matcher = AhoCorasick(self.ngrams)
+
+    def best(self, text: str, candidates: List[str]) -> str:
+        scores = [0.0] * len(self.langs)
+        padded = f" {text[:LANGID_NGRAM_CHARS].translate(_TO_SPACE)} "
+        for _, _, idx in self.matcher.iter_matches(padded):
+            for li, weight in self.weights[idx]:
+                scores[li] += weight
+        ranked = [
+            (scores[li], -li, lang)
+            for li, lang in enumerate(self.langs)
+            if lang in candidates
+        ]
+        if not ranked:
+            return candidates[0]
+        return max(ranked)[2]
+
+
+class LanguageIdentifier:
+    """Detects the LANG_CODES language of texts from their script and n-grams."""
+
+    def __init__(self, lang_codes: Dict[str, str], profiles: Optional[Dict] = None):
+        self.scripts = list(SCRIPT_RANGES)
+        # Code point -> 1-based script index (0 = not a letter of a known script)
+        self._table = np.zeros(0x10000, dtype=np.int64)
+        for i, script in enumerate(self.scripts, 1):
+            for lo, hi in SCRIPT_RANGES[script]:
+                self._table[lo : hi + 1] = i
+        for lo, hi in _NEUTRAL:
+            self._table[lo : hi + 1] = 0
+
+        self.script_langs: Dict[str, List[str]] = {}
+        self.lang_script: Dict[str, str] = {}
+        for lang, code in lang_codes.items():
+            script = code.split("_")[-1]
+            self.script_langs.setdefault(script, []).append(lang)
+            self.lang_script[lang] = script
+        for script, lang in EXTRA_SCRIPT_LANGS.items():
+            if lang in lang_codes:
+                self.script_langs.setdefault(script, []).append(lang)
+
+        profiles = profiles if profiles is not None else _load_profiles()
+        self._profiles = {}
+        for script, langs in self.script_langs.items():
+            if len(langs) > 1:
+                # Default (first) language of the script leads the candidate list
+                order = list(profiles.get(script, {}))
+                langs.sort(key=lambda l: order.index(l) if l in order else len(order))
+                self._profiles[script] = _Profile(profiles.get(script, {}))
+
+    def script_counts(self, texts: List[str]) -> np.ndarray:
+        """Letters per script for each text, shape (len(texts), 1 + len(scripts))."""
+        n_cols = len(self.scripts) + 1
+        if not texts:
+            return np.zeros((0, n_cols), dtype=np.int64)
+        joined = "".join(texts).encode("utf-32-le", errors="surrogatepass")
+        codepoints = np.frombuffer(joined, dtype=np.uint32)
+        # Code points beyond the BMP fall on U+FFFF, a non-character mapped to 0
+        script_ids = self._table[np.minimum(codepoints, 0xFFFF)]
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        text_ids = np.repeat(np.arange(len(texts)), lengths)
+        counts = np.bincount(
+            text_ids * n_cols + script_ids, minlength=len(texts) * n_cols
+        )
+        return counts.reshape(len(texts), n_cols)
+
+    def detect_batch(
+        self, texts: List[str], hint: Optional[str] = None
+    ) -> List[Optional[str]]:
+        """
+        Language of each text, or None for texts without letters. A hint (the
+        requested source language) wins over the n-gram profiles when it uses
+        the detected script.
+        """
+        counts = self.script_counts(texts)[:, 1:]
+        dominant = counts.argmax(axis=1)
+        has_letters = counts.max(axis=1) > 0
+        hint_script = self.lang_script.get(hint) if hint else None
+
+        detected = []
+        for text, script_idx, found in zip(texts, dominant.tolist(), has_letters):
+            if not found:
+                detected.append(None)
+                continue
+            script = self.scripts[script_idx]
+            candidates = self.script_langs.get(script)
+            if not candidates:
+                detected.append(None)
+            elif len(candidates) == 1:
+                detected.append(candidates[0])
+            elif hint is not None and (hint_script == script or hint in candidates):
+                detected.append(hint)
+            else:
+                detected.append(self._profiles[script].best(text, candidates))
+        return detected
+
+    def detect(self, text: str, hint: Optional[str] = None) -> Optional[str]:
+        return self.detect_batch([text], hint)[0]
+
+    def source_languages(self, texts: List[str], src_lang: str) -> List[str]:
+        """
+        Language to translate each text from: the detected one when src_lang is
+        AUTO, or when LANGID_OVERRIDE is on and the text is not in src_lang's
+        script. Texts without letters keep src_lang.
+        """
+        if src_lang != AUTO and not LANGID_OVERRIDE:
+            return [src_lang] * len(texts)
+        hint = None if src_lang == AUTO else src_lang
+        return [d or src_lang for d in self.detect_batch(texts, hint)]
+
+
+def _load_profiles() -> Dict:
+    if not LANGID_PROFILES:
+        return PROFILES
+    with open(LANGID_PROFILES, encoding="utf-8") as f:
+        extra = json.load(f)
+    merged = {
+        script: {l: dict(g) for l, g in langs.items()}
+        for script, langs in PROFILES.items()
+    }
+    for script, langs in extra.items():
+        for lang, ngrams in langs.items():
+            merged.setdefault(script, {}).setdefault(lang, {}).update(ngrams)
+    return merged
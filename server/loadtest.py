@@ -0,0 +1,763 @@
+# loadtest.py
+"""
+HTTP load generator for the translation endpoints.
+
+Replays a weighted mix of requests against a running server, or against one it
+starts itself. The mix covers short and long /translate texts and small and
+large PDFs for /translate-document-advanced, over several language pairs. It
+reports throughput, p50/p95/p99 latency and error and shed rates per scenario
+and per endpoint, plus the server's memory over time.
+
+Servers started here use the stand-in model (standin.py) unless --real-model is
+given. Runs then need neither the checkpoints nor a GPU and measure the serving
+path around the model: admission, batching, PDF processing and workers.
+
+    python loadtest.py run --duration 60 --concurrency 8
+    python loadtest.py run --url http://localhost:5000 --rate 5 --out run.json
+    python loadtest.py compare --duration 60 --concurrency 16 \\
+        --config baseline WORKER_POOL_SIZE=0 \\
+        --config pool WORKER_POOL_SIZE=2 ADMISSION_TRANSLATE=2:32
+
+A config is a name followed by environment overrides for the server. The
+special key CMD replaces the server command, with {port} filled in, e.g.
+"CMD=uvicorn asgi_server:app --host 127.0.0.1 --port {port}". Configs run one
+after another with the same seed, so each one sees the same request sequence.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import random
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import logs
+
+SERVER_DIR = Path(__file__).resolve().parent
+
+# ----------------------
+# Configuration
+# ----------------------
+# Relative weights of the request scenarios (see SCENARIOS)
+DEFAULT_MIX = "short=70,long=20,pdf_small=8,pdf_large=2"
+# Seconds between two samples of the server's memory
+MEMORY_SAMPLE_INTERVAL = 0.5
+# Seconds to wait for a started server to answer
+SERVER_STARTUP_TIMEOUT = 300.0
+# Server command for started servers; {python} and {port} are filled in
+DEFAULT_SERVER_CMD = (
+    '{python} -c "import server; '
+    "server.app.run(host='127.0.0.1', port={port}, threaded=True)\""
+)
+# Endpoint polled until a started server is up
+READY_PATH = "/admission-stats"
+# Statuses meaning the server shed the request rather than failed it
+SHED_STATUSES = (429, 503)
+
+# ----------------------
+# Workload
+# ----------------------
+# Enough vocabulary per script for language detection to agree with src_lang
+WORDS = {
+    "English": (
+        "the order was shipped to the customer after payment and the invoice "
+        "will be sent by email please check the delivery address before you "
+        "confirm our support team can help with returns and refunds within "
+        "thirty days of purchase"
+    ).split(),
+    "Hindi": (
+        "आपका ऑर्डर भुगतान के बाद ग्राहक को भेज दिया गया है और बिल ईमेल से "
+        "भेजा जाएगा कृपया पुष्टि करने से पहले पता जांच लें हमारी सहायता टीम "
+        "खरीद के तीस दिनों के भीतर वापसी में मदद कर सकती है"
+    ).split(),
+    "Tamil": (
+        "உங்கள் ஆர்டர் பணம் செலுத்திய பிறகு வாடிக்கையாளருக்கு அனுப்பப்பட்டது "
+        "மற்றும் விலைப்பட்டியல் மின்னஞ்சல் மூலம் அனுப்பப்படும் உறுதிப்படுத்தும் "
+        "முன் முகவரியை சரிபார்க்கவும் எங்கள் உதவிக் குழு முப்பது நாட்களுக்குள் "
+        "திருப்பி அனுப்ப உதவும்"
+    ).split(),
+}
+# (src_lang, tgt_lang) for /translate; the last pair pivots through English
+TEXT_PAIRS = [
+    ("English", "Hindi"),
+    ("English", "Tamil"),
+    ("Hindi", "English"),
+    ("Tamil", "English"),
+    ("auto", "English"),
+    ("Hindi", "Tamil"),
+]
+PDF_TARGETS = ["Hindi", "Tamil", "Bengali", "Marathi"]
+
+# name -> (endpoint, words per text or pages per PDF)
+SCENARIOS = {
+    "short": ("/translate", (4, 20)),
+    "long": ("/translate", (150, 400)),
+    "pdf_small": ("/translate-document-advanced", 1),
+    "pdf_large": ("/translate-document-advanced", 10),
+}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(
+                f"Unknown scenario {name!r} (known: {', '.join(SCENARIOS)})"
+            )
+        mix[name] = float(weight or 1)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+def _sentence_text(rng: random.Random, lang: str, n_words: int) -> str:
+    words = WORDS[lang]
+    stop = " ।" if lang == "Hindi" else "."
+    sentences = []
+    while n_words > 0:
+        length = min(n_words, rng.randint(6, 14))
+        sentences.append(" ".join(rng.choice(words) for _ in range(length)) + stop)
+        n_words -= length
+    return " ".join(sentences)
+
+
+_pdf_cache: Dict[Tuple[int, int], bytes] = {}
+_pdf_lock = threading.Lock()
+
+
+def make_pdf(pages: int, seed: int = 0) -> bytes:
+    """A deterministic English PDF of `pages` pages with a heading and paragraphs."""
+    key = (pages, seed)
+    with _pdf_lock:
+        if key not in _pdf_cache:
+            import fitz  # pymupdf
+
+            rng = random.Random(seed * 1000 + pages)
+            doc = fitz.open()
+            for number in range(pages):
+                page = doc.new_page()
+                page.insert_text((72, 72), f"Section {number + 1}", fontsize=16)
+                y = 100
+                for _ in range(5):
+                    rect = fitz.Rect(72, y, page.rect.width - 72, y + 110)
+                    page.insert_textbox(
+                        rect, _sentence_text(rng, "English", 60), fontsize=10
+                    )
+                    y += 125
+            _pdf_cache[key] = doc.tobytes()
+            doc.close()
+        return _pdf_cache[key]
+
+
+def _multipart(fields: Dict[str, str], filename: str, data: bytes):
+    boundary = f"loadtest{random.getrandbits(64):016x}"
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n".encode()
+        )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+        f'filename="{filename}"\r\nContent-Type: application/pdf\r\n\r\n'.encode()
+        + data
+        + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class Workload:
+    """Draws requests from the scenario mix; the same seed gives the same sequence."""
+
+    def __init__(self, mix: Dict[str, float], seed: int):
+        self.names = list(mix)
+        self.weights = [mix[n] for n in self.names]
+        self.seed = seed
+
+    def stream(self, stream_id: int):
+        """Endless (scenario, endpoint, body, content type) tuples for one client."""
+        rng = random.Random(f"{self.seed}:{stream_id}")
+        while True:
+            scenario = rng.choices(self.names, self.weights)[0]
+            endpoint, size = SCENARIOS[scenario]
+            if endpoint == "/translate":
+                src, tgt = rng.choice(TEXT_PAIRS)
+                lang = (
+                    rng.choice(["English", "Hindi", "Tamil"]) if src == "auto" else src
+                )
+                text = _sentence_text(rng, lang, rng.randint(*size))
+                body = json.dumps(
+                    {"text": text, "src_lang": src, "tgt_lang": tgt}, ensure_ascii=False
+                ).encode()
+                yield scenario, endpoint, body, "application/json"
+            else:
+                pdf = make_pdf(size, seed=rng.randrange(4))
+                body, ctype = _multipart(
+                    {"src_lang": "English", "tgt_lang": rng.choice(PDF_TARGETS)},
+                    f"{scenario}.pdf",
+                    pdf,
+                )
+                yield scenario, endpoint, body, ctype
+
+
+# ----------------------
+# Client
+# ----------------------
+class Client:
+    """One keep-alive connection; reconnects after errors."""
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self.timeout = timeout
+        self.conn = None
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self.conn = cls(self.host, self.port, timeout=self.timeout)
+
+    def request(
+        self, method: str, path: str, body: bytes = None, headers: Dict = None
+    ) -> Tuple[Optional[int], str]:
+        """Return (status, outcome); outcome is ok, shed, error or timeout."""
+        if self.conn is None:
+            self._connect()
+        try:
+            self.conn.request(method, path, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            response.read()
+        except socket.timeout:
+            self.close()
+            return None, "timeout"
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return None, "error"
+        status = response.status
+        if 200 <= status < 300:
+            return status, "ok"
+        if status in SHED_STATUSES:
+            return status, "shed"
+        return status, "error"
+
+    def get_json(self, path: str) -> Optional[Dict]:
+        if self.conn is None:
+            self._connect()
+        try:
+            self.conn.request("GET", path)
+            response = self.conn.getresponse()
+            body = response.read()
+            return json.loads(body) if response.status == 200 else None
+        except (OSError, ValueError, http.client.HTTPException):
+            self.close()
+            return None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Recorder:
+    """Thread-safe list of (scenario, endpoint, start, latency, status, outcome)."""
+
+    def __init__(self):
+        self.records: List[Tuple] = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def next_id(self) -> str:
+        return f"lt-{next(self._ids)}"
+
+    def add(self, *record):
+        with self._lock:
+            self.records.append(record)
+
+
+def _send(client: Client, recorder: Recorder, item, scheduled: float):
+    scenario, endpoint, body, ctype = item
+    headers = {"Content-Type": ctype, logs.REQUEST_ID_HEADER: recorder.next_id()}
+    status, outcome = client.request("POST", endpoint, body, headers)
+    recorder.add(
+        scenario, endpoint, scheduled, time.monotonic() - scheduled, status, outcome
+    )
+
+
+def run_closed(url, workload, recorder, concurrency, until, timeout):
+    """`concurrency` users, each sending its next request as soon as one completes."""
+
+    def user(index):
+        client = Client(url, timeout)
+        requests = workload.stream(index)
+        while time.monotonic() < until:
+            _send(client, recorder, next(requests), time.monotonic())
+        client.close()
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def run_open(url, workload, recorder, rate, until, timeout, max_in_flight):
+    """
+    Poisson arrivals at `rate` requests/s whatever the server's speed. Latency is
+    measured from the scheduled arrival, so client-side waiting is included.
+    """
+    local = threading.local()
+
+    def task(item, scheduled):
+        if not hasattr(local, "client"):
+            local.client = Client(url, timeout)
+        _send(local.client, recorder, item, scheduled)
+
+    rng = random.Random(f"{workload.seed}:arrivals")
+    requests = workload.stream(0)
+    with ThreadPoolExecutor(max_in_flight, thread_name_prefix="loadtest") as pool:
+        scheduled = time.monotonic()
+        while True:
+            scheduled += rng.expovariate(rate)
+            if scheduled >= until:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(task, next(requests), scheduled)
+
+
+# ----------------------
+# Server under test
+# ----------------------
+def _rss_mb(pid: int) -> float:
+    """Resident memory of pid and all its descendants, in MB."""
+    children = defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces; fields resume after its ")"
+        ppid = int(stat[stat.rfind(")") + 2 :].split()[1])
+        children[ppid].append(int(entry))
+    total_kb, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children.get(current, ()))
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            pass
+    return total_kb / 1024
+
+
+class MemorySampler(threading.Thread):
+    """Samples the RSS of a process tree every MEMORY_SAMPLE_INTERVAL seconds."""
+
+    def __init__(self, pid: int, t0: float):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.t0 = t0
+        self.samples: List[Tuple[float, float]] = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.samples.append(
+                (round(time.monotonic() - self.t0, 2), round(_rss_mb(self.pid), 1))
+            )
+            self._stop_event.wait(MEMORY_SAMPLE_INTERVAL)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerProcess:
+    """Starts a server with extra environment on a free local port, and stops it."""
+
+    def __init__(self, env: Dict[str, str], log_path: Path):
+        env = dict(env)
+        self.port = _free_port()
+        cmd = env.pop("CMD", DEFAULT_SERVER_CMD)
+        self.cmd = cmd.format(python=shlex.quote(sys.executable), port=self.port)
+        self.env = {**os.environ, **env}
+        self.log_path = log_path
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.proc = None
+
+    def __enter__(self):
+        self._log = open(self.log_path, "wb")
+        self.proc = subprocess.Popen(
+            self.cmd,
+            shell=True,
+            cwd=SERVER_DIR,
+            env=self.env,
+            stdout=self._log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+        end = time.monotonic() + SERVER_STARTUP_TIMEOUT
+        client = Client(self.url, timeout=5)
+        while time.monotonic() < end:
+            if self.proc.poll() is not None:
+                self._fail(f"server exited with {self.proc.returncode}")
+            status, _ = client.request("GET", READY_PATH)
+            if status == 200:
+                client.close()
+                return self
+            time.sleep(0.5)
+        self._fail("server did not become ready")
+
+    def _fail(self, message: str):
+        self.__exit__(None, None, None)
+        tail = self.log_path.read_text(errors="replace").splitlines()[-20:]
+        raise SystemExit(f"{message}: {self.cmd}\n" + "\n".join(tail))
+
+    def __exit__(self, *exc):
+        if self.proc.poll() is None:
+            os.killpg(self.proc.pid, signal.SIGTERM)
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+                self.proc.wait()
+        self._log.close()
+
+
+# ----------------------
+# Reporting
+# ----------------------
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _summary(records: List[Tuple], seconds: float) -> Dict:
+    outcomes = Counter(r[5] for r in records)
+    latencies = sorted(r[3] for r in records if r[5] == "ok")
+    n = len(records)
+    return {
+        "requests": n,
+        "ok": outcomes["ok"],
+        "throughput_rps": round(outcomes["ok"] / seconds, 2) if seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "error_rate": (
+            round((outcomes["error"] + outcomes["timeout"]) / n, 4) if n else 0.0
+        ),
+        "shed_rate": round(outcomes["shed"] / n, 4) if n else 0.0,
+        "timeouts": outcomes["timeout"],
+        "statuses": dict(Counter(str(r[4]) for r in records)),
+    }
+
+
+def summarize(records: List[Tuple], seconds: float) -> Dict[str, Dict]:
+    """Summaries per scenario, per endpoint and overall (latency of successes only)."""
+    groups = defaultdict(list)
+    for record in records:
+        groups[record[0]].append(record)
+        groups[record[1]].append(record)
+        groups["all"].append(record)
+    scenarios = [n for n in SCENARIOS if n in groups]
+    endpoints = sorted({r[1] for r in records})
+    return {k: _summary(groups[k], seconds) for k in scenarios + endpoints + ["all"]}
+
+
+def _memory_summary(samples: List[Tuple[float, float]]) -> Dict:
+    values = [mb for _, mb in samples]
+    if not values:
+        return {}
+    return {
+        "min_mb": min(values),
+        "mean_mb": round(sum(values) / len(values), 1),
+        "max_mb": max(values),
+        "end_mb": values[-1],
+        "series": samples,
+    }
+
+
+def _sparkline(samples: List[Tuple[float, float]], width: int = 12) -> str:
+    if not samples:
+        return ""
+    step = max(1, len(samples) // width)
+    return " ".join(f"{t:.0f}s:{mb:.0f}" for t, mb in samples[::step])
+
+
+_COLUMNS = [
+    ("requests", "{:>8}"),
+    ("throughput_rps", "{:>8.2f}"),
+    ("p50_ms", "{:>9.1f}"),
+    ("p95_ms", "{:>9.1f}"),
+    ("p99_ms", "{:>9.1f}"),
+    ("error_rate", "{:>7.1%}"),
+    ("shed_rate", "{:>7.1%}"),
+]
+_HEADER = f"{'':<30}{'reqs':>8}{'ok/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'err':>7}{'shed':>7}"
+
+
+def format_report(result: Dict) -> str:
+    lines = [f"== {result['name']} ({result['seconds']:.0f}s measured)", _HEADER]
+    for key, s in result["summary"].items():
+        lines.append(f"{key:<30}" + "".join(f.format(s[c]) for c, f in _COLUMNS))
+    memory = result.get("memory")
+    if memory:
+        lines.append(
+            f"memory MB: min {memory['min_mb']:.0f}  mean {memory['mean_mb']:.0f}  "
+            f"max {memory['max_mb']:.0f}  end {memory['end_mb']:.0f}"
+        )
+        lines.append(f"  over time: {_sparkline(memory['series'])}")
+    return "\n".join(lines)
+
+
+def format_comparison(results: List[Dict]) -> str:
+    """Each config's numbers per group, with the change relative to the first config."""
+    base = results[0]
+    lines = ["== comparison (relative to " + base["name"] + ")", _HEADER]
+    keys = list(dict.fromkeys(k for r in results for k in r["summary"]))
+    for key in keys:
+        lines.append(key)
+        for result in results:
+            s = result["summary"].get(key)
+            if s is None:
+                continue
+            row = f"  {result['name']:<28}" + "".join(
+                f.format(s[c]) for c, f in _COLUMNS
+            )
+            b = base["summary"].get(key)
+            if result is not base and b:
+                row += "  " + " ".join(
+                    f"{label} {_delta(b[c], s[c])}"
+                    for label, c in (("ok/s", "throughput_rps"), ("p99", "p99_ms"))
+                )
+            lines.append(row)
+    lines.append("memory max MB")
+    for result in results:
+        memory = result.get("memory") or {}
+        if memory:
+            lines.append(f"  {result['name']:<28}{memory['max_mb']:>8.0f}")
+    return "\n".join(lines)
+
+
+def _delta(before: float, after: float) -> str:
+    if not before or math.isnan(before) or math.isnan(after):
+        return "n/a"
+    return f"{(after - before) / before:+.0%}"
+
+
+# ----------------------
+# Runs
+# ----------------------
+def run_once(name: str, url: str, args, pid: Optional[int] = None) -> Dict:
+    workload = Workload(parse_mix(args.mix), args.seed)
+    for size in {s for n, (e, s) in SCENARIOS.items() if e != "/translate"}:
+        for seed in range(4):
+            make_pdf(size, seed)  # generate before the clock starts
+
+    recorder = Recorder()
+    t0 = time.monotonic()
+    sampler = MemorySampler(pid, t0) if pid else None
+    if sampler:
+        sampler.start()
+    until = t0 + args.warmup + args.duration
+    if args.rate:
+        run_open(
+            url, workload, recorder, args.rate, until, args.timeout, args.concurrency
+        )
+    else:
+        run_closed(url, workload, recorder, args.concurrency, until, args.timeout)
+    if sampler:
+        sampler.stop()
+
+    measured = [r for r in recorder.records if r[2] >= t0 + args.warmup]
+    result = {
+        "name": name,
+        "url": url,
+        "mode": f"open {args.rate}/s" if args.rate else f"closed x{args.concurrency}",
+        "seconds": args.duration,
+        "summary": summarize(measured, args.duration),
+        "admission": Client(url, timeout=5).get_json("/admission-stats"),
+    }
+    if sampler:
+        result["memory"] = _memory_summary(sampler.samples)
+    return result
+
+
+def _server_env(args, overrides: Dict[str, str]) -> Dict[str, str]:
+    env = {}
+    if not args.real_model:
+        env.update(
+            STANDIN_MODEL="1",
+            STANDIN_LATENCY_MS=str(args.latency_ms),
+            STANDIN_MS_PER_TOKEN=str(args.ms_per_token),
+            STANDIN_MODEL_MB=str(args.model_mb),
+        )
+    env.update(overrides)
+    return env
+
+
+def _parse_overrides(pairs: List[str]) -> Dict[str, str]:
+    overrides = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"Expected KEY=VALUE, got {pair!r}")
+        overrides[key] = value
+    return overrides
+
+
+def _run_config(name: str, overrides: Dict[str, str], args) -> Dict:
+    log_path = Path(tempfile.gettempdir()) / f"loadtest-{name}.log"
+    with ServerProcess(_server_env(args, overrides), log_path) as server:
+        print(f"[loadtest] {name}: {server.cmd} (log: {log_path})", file=sys.stderr)
+        result = run_once(name, server.url, args, server.proc.pid)
+    result["env"] = overrides
+    return result
+
+
+def _add_load_arguments(parser):
+    parser.add_argument(
+        "--duration", type=float, default=30, help="measured seconds (default: 30)"
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=5,
+        help="seconds of load before measuring, e.g. for model loads (default: 5)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="closed loop: concurrent users; open loop: max requests in flight",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0,
+        help="open loop with this many requests/s (default: closed loop)",
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"default: {DEFAULT_MIX}")
+    parser.add_argument(
+        "--timeout", type=float, default=120, help="client timeout in seconds"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", type=Path, help="write full results as JSON")
+    parser.add_argument(
+        "--real-model",
+        action="store_true",
+        help="started servers load the real models instead of the stand-in",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=40,
+        help="stand-in latency per generate call (default: 40)",
+    )
+    parser.add_argument(
+        "--ms-per-token",
+        type=float,
+        default=1.5,
+        help="stand-in latency per token (default: 1.5)",
+    )
+    parser.add_argument(
+        "--model-mb",
+        type=int,
+        default=0,
+        help="stand-in memory held per loaded model (default: 0)",
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load-test the translation endpoints and report latency percentiles."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="load one server")
+    _add_load_arguments(run)
+    run.add_argument("--url", help="existing server (default: start one)")
+    run.add_argument("--pid", type=int, help="sample memory of this existing server")
+    run.add_argument(
+        "--env",
+        nargs="*",
+        default=[],
+        metavar="KEY=VALUE",
+        help="environment for the started server",
+    )
+
+    compare = sub.add_parser("compare", help="load two or more server configs in turn")
+    _add_load_arguments(compare)
+    compare.add_argument(
+        "--config",
+        nargs="+",
+        action="append",
+        required=True,
+        metavar="NAME [KEY=VALUE ...]",
+        help="a named server config; repeat for each config",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.command == "run":
+        if args.url:
+            results = [run_once("server", args.url.rstrip("/"), args, args.pid)]
+        else:
+            results = [_run_config("server", _parse_overrides(args.env), args)]
+    else:
+        if len(args.config) < 2:
+            parser.error("compare needs at least two --config")
+        results = [
+            _run_config(config[0], _parse_overrides(config[1:]), args)
+            for config in args.config
+        ]
+
+    for result in results:
+        print(format_report(result))
+        print()
+    if len(results) > 1:
+        print(format_comparison(results))
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
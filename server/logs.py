@@ -0,0 +1,196 @@
+# logs.py
+import atexit
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+from typing import Dict, Optional
+
+# ----------------------
+# Configuration
+# ----------------------
+# DEBUG adds per-call payloads (texts, generate outputs); they are never formatted below it
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# "text" for humans, "json" for one JSON object per line
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+# Per-block messages (placement and insertion fallbacks) are logged 1 in N times
+LOG_SAMPLE_EVERY = int(os.environ.get("LOG_SAMPLE_EVERY", "100"))
+# Records waiting for the writer thread; beyond this they are dropped and counted
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = "X-Request-Id"
+
+_request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+_job_id: contextvars.ContextVar = contextvars.ContextVar("job_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed with extra= and is a field
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "request_id",
+    "job_id",
+}
+
+
+# ----------------------
+# Correlation ids
+# ----------------------
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Bind a request id to the current context: the client's, if usable, else a new one."""
+    if incoming and len(incoming) <= 64 and incoming.isprintable():
+        rid = incoming
+    else:
+        rid = uuid.uuid4().hex[:16]
+    _request_id.set(rid)
+    return rid
+
+
+def request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def set_request_id(rid: Optional[str]):
+    _request_id.set(rid)
+
+
+def set_job_id(job_id):
+    _job_id.set(job_id)
+
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        record.job_id = _job_id.get()
+        return True
+
+
+# ----------------------
+# Sampling
+# ----------------------
+_sample_counters: Dict[str, "itertools.count"] = {}
+
+
+def sampled(key: str, every: int = LOG_SAMPLE_EVERY) -> bool:
+    """True for the 1st, (N+1)th, (2N+1)th... occurrence of key."""
+    counter = _sample_counters.get(key)
+    if counter is None:
+        counter = _sample_counters.setdefault(key, itertools.count())
+    return every <= 1 or next(counter) % every == 0
+
+
+# ----------------------
+# Formatting and output
+# ----------------------
+def _fields(record) -> Dict:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    def format(self, record):
+        record.message = record.getMessage()
+        record.asctime = self.formatTime(record, self.datefmt)
+        line = self.formatMessage(record)
+        context = [
+            f"{k}={v}"
+            for k, v in (("request_id", record.request_id), ("job", record.job_id))
+            if v is not None
+        ]
+        context += [f"{k}={v}" for k, v in _fields(record).items()]
+        if context:
+            line = f"{line} | {' '.join(context)}"
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line = f"{line}\n{record.exc_text}"
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+            + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.request_id is not None:
+            entry["request_id"] = record.request_id
+        if record.job_id is not None:
+            entry["job_id"] = record.job_id
+        entry.update(_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: records that do not fit in the queue are dropped."""
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render the message now, as its args may change later; the writer thread formats the rest
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[_QueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup():
+    """
+    Route all logging through a bounded queue to one background writer thread.
+    Safe to call more than once; only the first call configures anything.
+    """
+    global _handler, _listener
+    if _handler is not None:
+        return
+    q: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    _handler = _QueueHandler(q)
+    _handler.addFilter(_ContextFilter())
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(q, out)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def stats() -> Dict:
+    return {
+        "level": logging.getLevelName(logging.getLogger().level),
+        "format": LOG_FORMAT,
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "sample_every": LOG_SAMPLE_EVERY,
+    }
@@ -0,0 +1,95 @@
+# page_store.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# ----------------------
+# Configuration
+# ----------------------
+# Maximum number of translated pages kept in memory (0 disables the store)
+PAGE_STORE_MAX_PAGES = int(os.environ.get("PAGE_STORE_MAX_PAGES", "2000"))
+# Upper bound on the total size of stored page PDFs
+PAGE_STORE_MAX_BYTES = int(os.environ.get("PAGE_STORE_MAX_MB", "512")) * 1024 * 1024
+# "lru" evicts the least recently reused page, "fifo" the oldest stored page
+PAGE_STORE_EVICTION = os.environ.get("PAGE_STORE_EVICTION", "lru").lower()
+
+PageKey = Tuple[str, str, str, str, str]
+
+
+class TranslatedPageStore:
+    """
+    In-memory store of rendered translated pages, keyed by the source page
+    fingerprint and the translation settings that produced them.
+    Each entry is a standalone single-page PDF (bytes).
+    """
+
+    def __init__(
+        self,
+        max_pages: int = PAGE_STORE_MAX_PAGES,
+        max_bytes: int = PAGE_STORE_MAX_BYTES,
+        eviction: str = PAGE_STORE_EVICTION,
+    ):
+        if eviction not in ("lru", "fifo"):
+            raise ValueError(f"Unknown page store eviction policy: {eviction}")
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self._pages: "OrderedDict[PageKey, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_pages > 0 and self.max_bytes > 0
+
+    def get(self, key: PageKey) -> Optional[bytes]:
+        with self._lock:
+            data = self._pages.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            if self.eviction == "lru":
+                self._pages.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: PageKey, data: bytes):
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._pages[key] = data
+            self._size += len(data)
+            while self._pages and (
+                len(self._pages) > self.max_pages or self._size > self.max_bytes
+            ):
+                _, evicted = self._pages.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._size = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "pages": len(self._pages),
+                "bytes": self._size,
+                "max_pages": self.max_pages,
+                "max_bytes": self.max_bytes,
+                "eviction": self.eviction,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+store = TranslatedPageStore()
@@ -0,0 +1,233 @@
+# profiling.py
+import cProfile
+import functools
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from flask import make_response, request
+
+# ----------------------
+# Configuration
+# ----------------------
+# Where per-request profiles are written (one sub-directory per profile)
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "./profiles")
+# Number of profiles kept; the oldest are deleted beyond this
+PROFILE_RETENTION = int(os.environ.get("PROFILE_RETENTION", "50"))
+# Profile every Nth request to a profiled endpoint (0 = only on demand)
+PROFILE_SAMPLE_EVERY = int(os.environ.get("PROFILE_SAMPLE_EVERY", "0"))
+# Clients allowed to request a profile with the X-Profile header or ?profile=1
+PROFILE_ALLOWED_CLIENTS = {
+    c.strip()
+    for c in os.environ.get("PROFILE_ALLOWED_CLIENTS", "127.0.0.1,::1").split(",")
+    if c.strip()
+}
+# Also capture a torch.profiler trace (chrome trace format)
+PROFILE_TORCH = os.environ.get("PROFILE_TORCH", "1") == "1"
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+# Name of the directory each capture writes, e.g. 20250101-120000-1a2b3c4d
+_PROFILE_ID_RE = re.compile(r"\d{8}-\d{6}-[0-9a-f]{8}")
+
+log = logging.getLogger("profiling")
+
+_request_counter = itertools.count(1)
+# cProfile cannot run concurrently in one interpreter; one profiled request at a time
+_profile_lock = threading.Lock()
+
+
+def client_allowed() -> bool:
+    return request.remote_addr in PROFILE_ALLOWED_CLIENTS
+
+
+def _trigger() -> Optional[str]:
+    """Why this request should be profiled, or None."""
+    if PROFILE_SAMPLE_EVERY > 0 and next(_request_counter) % PROFILE_SAMPLE_EVERY == 0:
+        return "sampled"
+    if (
+        request.headers.get(PROFILE_HEADER) == "1" or request.args.get("profile") == "1"
+    ) and client_allowed():
+        return "requested"
+    return None
+
+
+def profiled(view):
+    """
+    Wrap a Flask view so that, when triggered, it runs under cProfile and
+    torch.profiler. The profile id is returned in the X-Profile-Id header.
+    Streamed responses are profiled until the stream is closed, as their
+    work happens while the response is iterated.
+    When not triggered the view is called directly.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if (
+            PROFILE_SAMPLE_EVERY <= 0
+            and PROFILE_HEADER not in request.headers
+            and "profile" not in request.args
+        ):
+            return view(*args, **kwargs)
+        trigger = _trigger()
+        if trigger is None or not _profile_lock.acquire(blocking=False):
+            return view(*args, **kwargs)
+        # The lock is released once the capture is finished
+        return _run_profiled(view, trigger, args, kwargs)
+
+    return wrapper
+
+
+class _Capture:
+    """One request's cProfile (and torch.profiler) capture, written out on finish."""
+
+    def __init__(self, trigger: str):
+        self.trigger = trigger
+        self.profile_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+        self.out_dir = os.path.join(PROFILE_DIR, self.profile_id)
+        # Kept here: a streamed response finishes outside the request context
+        self.path = request.path
+        self.method = request.method
+        os.makedirs(self.out_dir, exist_ok=True)
+
+        self.torch_prof = None
+        if PROFILE_TORCH:
+            import torch
+            from torch.profiler import ProfilerActivity
+
+            activities = [ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(ProfilerActivity.CUDA)
+            self.torch_prof = torch.profiler.profile(activities=activities)
+        self.cprof = cProfile.Profile()
+        self.t0 = 0.0
+        self.elapsed = 0.0
+
+    def start(self):
+        self.t0 = time.perf_counter()
+        if self.torch_prof is not None:
+            self.torch_prof.__enter__()
+        self.cprof.enable()
+
+    def stop(self):
+        self.cprof.disable()
+        if self.torch_prof is not None:
+            self.torch_prof.__exit__(None, None, None)
+        self.elapsed = time.perf_counter() - self.t0
+
+    def write(self, status: int):
+        out_dir = self.out_dir
+        self.cprof.dump_stats(os.path.join(out_dir, "cprofile.prof"))
+        summary = io.StringIO()
+        stats = pstats.Stats(self.cprof, stream=summary)
+        stats.sort_stats("cumulative").print_stats(60)
+        with open(os.path.join(out_dir, "cprofile.txt"), "w") as f:
+            f.write(summary.getvalue())
+        if self.torch_prof is not None:
+            self.torch_prof.export_chrome_trace(
+                os.path.join(out_dir, "torch_trace.json")
+            )
+        meta = {
+            "id": self.profile_id,
+            "endpoint": self.path,
+            "method": self.method,
+            "trigger": self.trigger,
+            "status": status,
+            "seconds": round(self.elapsed, 4),
+            "created": time.time(),
+        }
+        import worker_pool
+
+        if worker_pool.WORKER_POOL_SIZE > 0:
+            meta["worker_pool_size"] = worker_pool.WORKER_POOL_SIZE
+            meta["note"] = (
+                "Generation for pooled directions runs in worker processes, which "
+                "are not profiled; their time shows up here as waits in "
+                "Future.result."
+            )
+        with open(os.path.join(out_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        _enforce_retention()
+        log.info(
+            "%s (%s) took %.3fs → %s", self.path, self.trigger, self.elapsed, out_dir
+        )
+
+
+def _run_profiled(view, trigger, args, kwargs):
+    try:
+        capture = _Capture(trigger)
+        capture.start()
+    except BaseException:
+        _profile_lock.release()
+        raise
+    try:
+        response = make_response(view(*args, **kwargs))
+    except BaseException:
+        capture.stop()
+        _profile_lock.release()
+        raise
+
+    def finish():
+        try:
+            capture.stop()
+            capture.write(response.status_code)
+        finally:
+            _profile_lock.release()
+
+    response.headers[PROFILE_ID_HEADER] = capture.profile_id
+    if response.is_streamed:
+        # The work of a streamed response happens while it is iterated
+        response.call_on_close(finish)
+    else:
+        finish()
+    return response
+
+
+def _enforce_retention():
+    """Delete the oldest profiles beyond PROFILE_RETENTION; other entries are kept."""
+    try:
+        entries = [
+            e
+            for e in os.scandir(PROFILE_DIR)
+            if _PROFILE_ID_RE.fullmatch(e.name) and e.is_dir(follow_symlinks=False)
+        ]
+    except OSError:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for entry in entries[: max(0, len(entries) - PROFILE_RETENTION)]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def list_profiles() -> List[Dict]:
+    profiles = []
+    try:
+        entries = list(os.scandir(PROFILE_DIR))
+    except OSError:
+        return profiles
+    for entry in entries:
+        meta_path = os.path.join(entry.path, "meta.json")
+        if entry.is_dir() and os.path.isfile(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            meta["files"] = sorted(os.listdir(entry.path))
+            profiles.append(meta)
+    profiles.sort(key=lambda m: m.get("created", 0), reverse=True)
+    return profiles
+
+
+def profile_file_path(profile_id: str, name: str) -> Optional[str]:
+    """Absolute path of a file inside a stored profile, or None if it does not exist."""
+    base = os.path.realpath(PROFILE_DIR)
+    path = os.path.realpath(os.path.join(base, profile_id, name))
+    if not path.startswith(base + os.sep) or not os.path.isfile(path):
+        return None
+    return path
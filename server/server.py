@@ -1,324 +1,167 @@
-import gc
 import io
 import json
 import logging
 import shutil
-from typing import Dict, List, Optional
+import time
 
+import admission
+import bulk
 import doc_translator
-import torch
+import glossary
+import langid
+import logs
+import page_store
+import profiling
+import standin
 import torchaudio
-from flask import Flask, jsonify, request, send_file
+import worker_pool
+from engine import LANG_CODES, cache, language_id, translate_batch, translate_text
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
-from IndicTransToolkit.processor import IndicProcessor
-from transformers import (AutoModelForSeq2SeqLM, AutoTokenizer,
-                          WhisperForConditionalGeneration, WhisperProcessor)
 
 # transformers_logger = logging.getLogger("transformers")
 # transformers_logger.setLevel(logging.DEBUG)
 
+logs.setup()
+log = logging.getLogger("server")
+
 
 # ----------------------
 # Flask & CORS setup
 # ----------------------
 app = Flask(__name__)
-CORS(app)  # Allow all origins for frontend
+CORS(
+    app,
+    expose_headers=[
+        "X-Pages-Reused",
+        "X-Pages-Recomputed",
+        profiling.PROFILE_ID_HEADER,
+        logs.REQUEST_ID_HEADER,
+    ],
+)  # Allow all origins for frontend
 
-# ----------------------
-# Device
-# ----------------------
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"[INIT] USING DEVICE: {DEVICE}")
-if DEVICE == "cuda":
-    print(f"[INIT] GPU: {torch.cuda.get_device_name(0)}")
-    print(f"[INIT] CUDA Version: {torch.version.cuda}")
 
-# Check ffmpeg
-FFMPEG_PATH = shutil.which("ffmpeg")
-if FFMPEG_PATH is None:
-    raise RuntimeError("ffmpeg not found in PATH. Please install ffmpeg.")
-print(f"[INIT] Using ffmpeg at: {FFMPEG_PATH}")
+@app.before_request
+def _bind_request_id():
+    logs.new_request_id(request.headers.get(logs.REQUEST_ID_HEADER))
 
-# Model paths
-WHISPER_MODEL = "./models/whisper-medium"
-MODEL_PATH_EN_INDIC = "./models/indictrans2-en-indic-1B"
-MODEL_PATH_INDIC_EN = "./models/indictrans2-indic-en-1B"
-
-# ----------------------
-# Language codes
-# ----------------------
-LANG_CODES = {
-    "Assamese": "asm_Beng",
-    "Bengali": "ben_Beng",
-    "English": "eng_Latn",
-    "Gujarati": "guj_Gujr",
-    "Hindi": "hin_Deva",
-    "Kannada": "kan_Knda",
-    "Malayalam": "mal_Mlym",
-    "Marathi": "mar_Deva",
-    "Nepali": "npi_Deva",
-    "Odia": "ory_Orya",
-    "Punjabi": "pan_Guru",
-    "Sanskrit": "san_Deva",
-    "Tamil": "tam_Taml",
-    "Telugu": "tel_Telu",
-    "Urdu": "urd_Arab",
-    "Kashmiri": "kas_Arab",
-    "Maithili": "mai_Deva",
-    "Sindhi": "snd_Arab",
-    "Bodo": "brx_Deva",
-    "Dogri": "doi_Deva",
-    "Konkani": "kok_Deva",
-    "Manipuri": "mni_Beng",
-    "Santali": "sat_Olck",
-}
 
+@app.after_request
+def _add_request_id_header(response):
+    response.headers[logs.REQUEST_ID_HEADER] = logs.request_id() or ""
+    return response
 
-# ----------------------
-# Model cache
-# ----------------------
-class ModelCache:
-    def __init__(self):
-        self.whisper_processor: Optional[WhisperProcessor] = None
-        self.whisper_model: Optional[WhisperForConditionalGeneration] = None
-
-        self.tok_en_indic: Optional[AutoTokenizer] = None
-        self.model_en_indic: Optional[AutoModelForSeq2SeqLM] = None
-        self.tok_indic_en: Optional[AutoTokenizer] = None
-        self.model_indic_en: Optional[AutoModelForSeq2SeqLM] = None
-        self.indic_processor: Optional[IndicProcessor] = None
-
-    # ------------- Whisper -------------
-    def load_whisper(self):
-        if self.whisper_processor is None or self.whisper_model is None:
-            print("[LAZY] Loading Whisper-Medium model...")
-            self.whisper_processor = WhisperProcessor.from_pretrained(
-                WHISPER_MODEL, local_files_only=True
-            )
-            self.whisper_model = WhisperForConditionalGeneration.from_pretrained(
-                WHISPER_MODEL,
-                local_files_only=True,
-                dtype=torch.float16 if DEVICE == "cuda" else torch.float32,
-            )
-            self.whisper_model = self.whisper_model.to(DEVICE)
-            print(f"[LAZY] Whisper model loaded on {DEVICE}")
-        return self.whisper_processor, self.whisper_model
-
-    def unload_whisper(self):
-        if self.whisper_model is not None:
-            print("[CLEANUP] Unloading Whisper model...")
-            del self.whisper_model
-            del self.whisper_processor
-            self.whisper_model = None
-            self.whisper_processor = None
-        gc.collect()
-        if DEVICE == "cuda":
-            torch.cuda.empty_cache()
-        print("[CLEANUP] Whisper model unloaded.")
-
-    # ------------- Translation -------------
-    def load_translation_models(self, direction):
-
-        if self.indic_processor is None:
-            print("[LAZY] Loading IndicProcessor...")
-            self.indic_processor = IndicProcessor(inference=True)
-
-        if direction == "en_to_indic":
-            if self.tok_en_indic is None or self.model_en_indic is None:
-                print("[LAZY] Loading EN→Indic translation model...")
-                self.tok_en_indic = AutoTokenizer.from_pretrained(
-                    MODEL_PATH_EN_INDIC, local_files_only=True, trust_remote_code=True
-                )
-                self.model_en_indic = AutoModelForSeq2SeqLM.from_pretrained(
-                    MODEL_PATH_EN_INDIC,
-                    local_files_only=True,
-                    trust_remote_code=True,
-                    dtype=torch.float16 if DEVICE == "cuda" else torch.float32,
-                )
-                self.model_en_indic = self.model_en_indic.to(DEVICE)
-                assert self.model_en_indic is not None, "Model did not load correctly!"
-                print(f"[LAZY] EN→Indic model loaded on {DEVICE}")
-            return self.tok_en_indic, self.model_en_indic, self.indic_processor
-
-        elif direction == "indic_to_en":
-            if self.tok_indic_en is None or self.model_indic_en is None:
-                print("[LAZY] Loading Indic→EN translation model...")
-                self.tok_indic_en = AutoTokenizer.from_pretrained(
-                    MODEL_PATH_INDIC_EN, local_files_only=True, trust_remote_code=True
-                )
-                self.model_indic_en = AutoModelForSeq2SeqLM.from_pretrained(
-                    MODEL_PATH_INDIC_EN,
-                    local_files_only=True,
-                    trust_remote_code=True,
-                    dtype=torch.float16 if DEVICE == "cuda" else torch.float32,
-                )
-                self.model_indic_en = self.model_indic_en.to(DEVICE)
-                assert self.model_indic_en is not None, "Model did not load correctly!"
-                print(f"[LAZY] Indic→EN model loaded on {DEVICE}")
-            return self.tok_indic_en, self.model_indic_en, self.indic_processor
-
-    def unload_translation(self):
-        if self.model_en_indic:
-            del self.model_en_indic, self.tok_en_indic
-            self.model_en_indic = None
-            self.tok_en_indic = None
-        if self.model_indic_en:
-            del self.model_indic_en, self.tok_indic_en
-            self.model_indic_en = None
-            self.tok_indic_en = None
-        if self.indic_processor:
-            del self.indic_processor
-            self.indic_processor = None
-        gc.collect()
-        if DEVICE == "cuda":
-            torch.cuda.empty_cache()
-        print("[CLEANUP] Translation models unloaded.")
-
-
-cache = ModelCache()
-
-
-# ----------------------
-# Helpers
-# ----------------------
-def normalize_lang(lang):
-    return LANG_CODES.get(lang, lang)
 
-
-def translate_text(text, src_lang, tgt_lang):
-    src_code = LANG_CODES[src_lang]
-    tgt_code = LANG_CODES[tgt_lang]
-
-    print(f"[TRANSLATE] Request: '{text}' from {src_lang} → {tgt_lang}")
-
-    try:
-        # Load processor & model
-        ip = cache.indic_processor or IndicProcessor(inference=True)
-        if src_code.startswith("eng") and not tgt_code.startswith("eng"):
-            tok, model, _ = cache.load_translation_models("en_to_indic")
-        elif not src_code.startswith("eng") and tgt_code.startswith("eng"):
-            tok, model, _ = cache.load_translation_models("indic_to_en")
-        else:
-            # Indic→Indic: relay via English
-            mid = translate_text(text, src_lang, "English")
-            return translate_text(mid, "English", tgt_lang)
-
-        # Put model in eval and disable caching to avoid past_key_values issues
-        model.eval()
-        # Ensure both config and runtime generation request use_cache=False
-        try:
-            model.config.use_cache = False
-        except Exception:
-            # some model wrappers might not have config; ignore if not present
-            pass
-
-        # Preprocess
-        if ip:
-            batch = ip.preprocess_batch([text], src_lang=src_code, tgt_lang=tgt_code)
-        else:
-            batch = [text]
-
-        # Build inputs
-        if isinstance(batch, dict):
-            inputs = {}
-            for k, v in batch.items():
-                if isinstance(v, torch.Tensor):
-                    inputs[k] = v.to(DEVICE)
-                else:
-                    try:
-                        inputs[k] = torch.tensor(v, device=DEVICE)
-                    except Exception:
-                        continue
-        else:
-            enc = tok(
-                batch,
-                truncation=True,
-                padding="longest",
-                return_tensors="pt",
-                return_attention_mask=True,
-                max_length=256,
-            )
-            inputs = {
-                k: v.to(DEVICE) for k, v in enc.items() if isinstance(v, torch.Tensor)
-            }
-
-        # Sanity: must have input_ids
-        if "input_ids" not in inputs or inputs["input_ids"] is None:
-            raise RuntimeError(
-                "tokenizer/processor did not return 'input_ids'. Check input types and processor output."
-            )
-
-        # Ensure tensors are on the same device as the model
-        model_device = next(model.parameters()).device
-        for k, v in list(inputs.items()):
-            if isinstance(v, torch.Tensor):
-                inputs[k] = v.to(model_device)
-
-        gen_kwargs = {
-            "input_ids": inputs.get("input_ids"),
-            # explicitly disable use_cache to avoid past_key_values access in forward
-            "use_cache": False,
-            # safe defaults:
-            "num_beams": 5,
-            "max_length": 256,
-            "num_return_sequences": 1,
-        }
-        if inputs.get("attention_mask") is not None:
-            gen_kwargs["attention_mask"] = inputs.get("attention_mask")
-
-        with torch.no_grad():
-            outputs = model.generate(**gen_kwargs)
-
-        print("[DEBUG] outputs:", outputs)
-        if outputs is not None:
-            print("[DEBUG] outputs shape:", getattr(outputs, "shape", "n/a"))
-        else:
-            print("[DEBUG] outputs is None!")
-
-        decoded = tok.batch_decode(outputs, skip_special_tokens=True)
-        if ip:
-            decoded = ip.postprocess_batch(decoded, lang=tgt_code)
-        print(decoded[0])
-        return decoded[0]
-
-    except Exception as e:
-        print("[ERROR] IndicTrans2 translation failed:", e)
-        import traceback
-
-        traceback.print_exc()
-        return "[Translation Error]"
+# Check ffmpeg
+FFMPEG_PATH = shutil.which("ffmpeg")
+if FFMPEG_PATH is None:
+    if not standin.STANDIN_MODEL:
+        raise RuntimeError("ffmpeg not found in PATH. Please install ffmpeg.")
+    log.warning("ffmpeg not found; audio endpoints will not work")
+else:
+    log.info("Using ffmpeg at: %s", FFMPEG_PATH)
 
 
 # ----------------------
 # Flask endpoints
 # ----------------------
 @app.route("/translate", methods=["POST"])
+@admission.admit("translate")
+@profiling.profiled
 def translate_endpoint():
     data = request.get_json()
-    print(f"[TRANSLATE ENDPOINT] Raw data: {request.data}")
+    log.debug("Raw payload: %r", request.data)
     if not data or "text" not in data:
         return jsonify({"error": "No text provided"}), 400
 
     text = data["text"]
     src_lang = data.get("src_lang", "English")
     tgt_lang = data.get("tgt_lang", "English")
-
-    print(
-        f"[TRANSLATE ENDPOINT] Received text: '{text[:50]}...' | {src_lang} → {tgt_lang}"
+    glossary_obj = None
+    if data.get("glossary"):
+        glossary_obj = glossary.store.get(data["glossary"])
+        if glossary_obj is None:
+            return jsonify({"error": f"Unknown glossary: {data['glossary']}"}), 400
+
+    detected_lang = language_id.source_languages([text], src_lang)[0]
+    log.info(
+        "/translate %s → %s",
+        detected_lang,
+        tgt_lang,
+        extra={"chars": len(text), "requested_src": src_lang},
     )
-    translated = translate_text(text, src_lang, tgt_lang)
+    translated = translate_text(text, detected_lang, tgt_lang, glossary_obj)
     cache.unload_translation()
 
     return jsonify(
         {
-            "detected_lang": src_lang,
+            "detected_lang": detected_lang,
             "translation": translated,
             "translated_to": tgt_lang,
         }
     )
 
 
+@app.route("/translate-bulk", methods=["POST"])
+@admission.admit("bulk")
+@profiling.profiled
+def translate_bulk_endpoint():
+    """
+    Streamed NDJSON/JSONL in, streamed NDJSON out.
+    Each input line: {"id": ..., "text": ..., "src_lang": ..., "tgt_lang": ...}
+    (src_lang/tgt_lang/glossary default to the query parameters of the same name).
+    Each output line: {"id", "translation", "src_lang", "tgt_lang"} or {"id", "error"},
+    in completion order. Models stay loaded until the whole body is processed.
+    """
+    default_src = request.args.get("src_lang", "English")
+    default_tgt = request.args.get("tgt_lang", "English")
+    glossary_obj = None
+    if request.args.get("glossary"):
+        glossary_obj = glossary.store.get(request.args["glossary"])
+        if glossary_obj is None:
+            return (
+                jsonify({"error": f"Unknown glossary: {request.args['glossary']}"}),
+                400,
+            )
+
+    def translate_fn(texts, src_lang, tgt_lang):
+        return translate_batch(texts, src_lang, tgt_lang, glossary_obj)
+
+    def generate():
+        count = 0
+        t0 = time.perf_counter()
+        try:
+            # Concurrent /translate requests must not unload the models mid-stream
+            with cache.pin_translation():
+                records = bulk.parse_ndjson(
+                    request.stream,
+                    default_src,
+                    default_tgt,
+                    LANG_CODES,
+                    auto_lang=langid.AUTO,
+                )
+                for result in bulk.iter_bulk_translations(records, translate_fn):
+                    count += 1
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+        except admission.RequestCancelled as e:
+            admission.record_cancelled("bulk", e.reason)
+            yield json.dumps({"error": f"cancelled: {e.reason}"}) + "\n"
+        finally:
+            cache.unload_translation()
+            elapsed = time.perf_counter() - t0
+            log.info(
+                "Bulk: %d records in %.1fs (%.1f records/s)",
+                count,
+                elapsed,
+                count / elapsed if elapsed else 0,
+            )
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
 @app.route("/translate-document-advanced", methods=["POST"])
+@admission.admit("document")
+@profiling.profiled
 def translate_document_endpoint():
     if "file" not in request.files:
         return jsonify({"error": "No file part"}), 400
@@ -328,23 +171,141 @@ def translate_document_endpoint():
 
     src_lang = request.form.get("src_lang", "English")
     tgt_lang = request.form.get("tgt_lang", "English")
+    glossary_obj = None
+    if request.form.get("glossary"):
+        glossary_obj = glossary.store.get(request.form["glossary"])
+        if glossary_obj is None:
+            return (
+                jsonify({"error": f"Unknown glossary: {request.form['glossary']}"}),
+                400,
+            )
 
     try:
         pdf_bytes = pdf_file.read()
+        page_stats = {}
         translated_pdf_buf = doc_translator.translate_pdf_bytes_preserve_layout(
-            pdf_bytes, src_lang, tgt_lang
+            pdf_bytes,
+            src_lang,
+            tgt_lang,
+            stats=page_stats,
+            glossary_obj=glossary_obj,
+            translate_batch_fn=translate_batch,
         )
-        return send_file(
+        response = send_file(
             translated_pdf_buf,
             as_attachment=True,
             download_name=f"translated_{pdf_file.filename}",
             mimetype="application/pdf",
         )
+        response.headers["X-Pages-Reused"] = str(page_stats.get("pages_reused", 0))
+        response.headers["X-Pages-Recomputed"] = str(
+            page_stats.get("pages_recomputed", 0)
+        )
+        return response
+    except admission.RequestCancelled:
+        raise
     except Exception as e:
-        app.logger.exception("Error translating PDF")
+        log.exception("Error translating PDF")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/glossaries", methods=["GET"])
+def list_glossaries_endpoint():
+    return jsonify(glossary.store.list())
+
+
+@app.route("/glossaries/<name>", methods=["PUT"])
+def put_glossary_endpoint(name):
+    """
+    Body: {"src_lang": "English", "tgt_lang": "Hindi", "case_sensitive": false,
+           "entries": {"source term": "target term", ...}}
+    (entries may also be a list of {"source": ..., "target": ...}).
+    """
+    data = request.get_json()
+    if not data or "entries" not in data:
+        return jsonify({"error": "No entries provided"}), 400
+    src_lang = data.get("src_lang", "English")
+    tgt_lang = data.get("tgt_lang", "English")
+    if src_lang not in LANG_CODES or tgt_lang not in LANG_CODES:
+        return jsonify({"error": "Unsupported language"}), 400
+
+    entries = data["entries"]
+    if isinstance(entries, list):
+        entries = {
+            e["source"]: e["target"] for e in entries if "source" in e and "target" in e
+        }
+    try:
+        glossary_obj = glossary.store.put(
+            name, src_lang, tgt_lang, entries, bool(data.get("case_sensitive", False))
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 413
+    return jsonify(glossary_obj.describe())
+
+
+@app.route("/glossaries/<name>", methods=["DELETE"])
+def delete_glossary_endpoint(name):
+    if not glossary.store.delete(name):
+        return jsonify({"error": f"Unknown glossary: {name}"}), 404
+    return jsonify({"status": "deleted"})
+
+
+@app.route("/admission-stats", methods=["GET"])
+def admission_stats_endpoint():
+    return jsonify(admission.stats())
+
+
+@app.route("/log-stats", methods=["GET"])
+def log_stats_endpoint():
+    return jsonify(logs.stats())
+
+
+@app.route("/model-stats", methods=["GET"])
+def model_stats_endpoint():
+    return jsonify(cache.load_stats)
+
+
+@app.route("/workers", methods=["GET"])
+def workers_endpoint():
+    pool = worker_pool.get_pool()
+    if pool is None:
+        return jsonify({"enabled": False, "workers": []})
+    return jsonify({"enabled": True, "workers": pool.stats()})
+
+
+@app.route("/profiles", methods=["GET"])
+def list_profiles_endpoint():
+    if not profiling.client_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(profiling.list_profiles())
+
+
+@app.route("/profiles/<profile_id>/<name>", methods=["GET"])
+def get_profile_file_endpoint(profile_id, name):
+    if not profiling.client_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    path = profiling.profile_file_path(profile_id, name)
+    if path is None:
+        return jsonify({"error": "Not found"}), 404
+    return send_file(path, as_attachment=True, download_name=f"{profile_id}_{name}")
+
+
+@app.route("/placement-stats", methods=["GET"])
+def placement_stats_endpoint():
+    return jsonify(doc_translator.get_placement_stats())
+
+
+@app.route("/page-store", methods=["GET"])
+def page_store_stats_endpoint():
+    return jsonify(page_store.store.stats())
+
+
+@app.route("/page-store", methods=["DELETE"])
+def page_store_clear_endpoint():
+    page_store.store.clear()
+    return jsonify({"status": "cleared"})
+
+
 # Keep Whisper endpoints unchanged...
 # transcribe_with_whisper(), load_audio(), /transcribe, /unload
 
@@ -0,0 +1,56 @@
+# standin.py
+"""
+Deterministic stand-in for the IndicTrans2 models (STANDIN_MODEL=1).
+
+Lets the server, and load tests against it, run without the checkpoints. A
+batch takes STANDIN_LATENCY_MS plus STANDIN_MS_PER_TOKEN for each token of its
+longest text, as beam search decodes the whole batch for the longest output.
+Each text comes back as a copy tagged with the target language code.
+"""
+
+import os
+import time
+from typing import Callable, List, Optional, Tuple
+
+# ----------------------
+# Configuration
+# ----------------------
+STANDIN_MODEL = os.environ.get("STANDIN_MODEL", "0") == "1"
+# Fixed cost of one generate() call
+STANDIN_LATENCY_MS = float(os.environ.get("STANDIN_LATENCY_MS", "40"))
+# Decoding cost per token of the longest text in the batch
+STANDIN_MS_PER_TOKEN = float(os.environ.get("STANDIN_MS_PER_TOKEN", "1.5"))
+# Spin instead of sleeping, to hold a core (and the GIL) like CPU inference
+STANDIN_BUSY = os.environ.get("STANDIN_BUSY", "0") == "1"
+# Memory held per loaded direction, to mimic model load/unload in RSS
+STANDIN_MODEL_MB = int(os.environ.get("STANDIN_MODEL_MB", "0"))
+
+
+def load_weights() -> bytes:
+    """Touched (so resident) ballast standing in for one direction's weights."""
+    return b"\x01" * (STANDIN_MODEL_MB * 1024 * 1024)
+
+
+def generate(
+    texts: List[str], tgt_code: str, check: Optional[Callable[[], None]] = None
+) -> Tuple[List[str], int]:
+    """
+    Return (translations, output tokens) after the configured latency.
+    check is called while waiting and may raise to abandon the batch.
+    """
+    tokens = [len(t.split()) + 1 for t in texts]
+    seconds = (STANDIN_LATENCY_MS + STANDIN_MS_PER_TOKEN * max(tokens)) / 1000
+    end = time.perf_counter() + seconds
+    while True:
+        remaining = end - time.perf_counter()
+        if remaining <= 0:
+            break
+        if check is not None:
+            check()
+        if STANDIN_BUSY:
+            stop = time.perf_counter() + min(remaining, 0.01)
+            while time.perf_counter() < stop:
+                pass
+        else:
+            time.sleep(min(remaining, 0.05))
+    return [f"[{tgt_code}] {t}" for t in texts], sum(tokens)
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The server modules import each other as top-level modules
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR))
@@ -0,0 +1,162 @@
+from pathlib import Path
+
+import fitz  # pymupdf
+import pytest
+
+import bulk
+import doc_translator
+import page_store
+
+FONTS_DIR = str(Path(__file__).resolve().parent.parent / "fonts")
+
+
+def _make_pdf(pages: int = 2, structure: bool = False) -> bytes:
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Heading of page {number + 1}", fontsize=16)
+        page.insert_textbox(
+            fitz.Rect(72, 120, 520, 220),
+            "The first paragraph is long enough to wrap over more than one line.",
+            fontsize=11,
+        )
+        page.insert_textbox(
+            fitz.Rect(72, 300, 520, 400),
+            "A second paragraph, far below the first one.",
+            fontsize=11,
+        )
+    if structure:
+        doc[0].insert_link(
+            {
+                "kind": fitz.LINK_GOTO,
+                "from": fitz.Rect(72, 500, 200, 520),
+                "page": pages - 1,
+                "to": fitz.Point(72, 72),
+            }
+        )
+        doc.set_page_labels(
+            [{"startpage": 0, "prefix": "A-", "style": "D", "firstpagenum": 1}]
+        )
+        doc.set_toc([[1, "Last page", pages]])
+        doc.embfile_add("notes.txt", b"attached")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _fake_translate(texts, src_lang, tgt_lang, glossary_obj=None):
+    return [f"translated {i}" for i in range(len(texts))]
+
+
+@pytest.fixture(autouse=True)
+def empty_page_store(monkeypatch):
+    monkeypatch.setattr(page_store, "store", page_store.TranslatedPageStore())
+
+
+def test_translate_multi_block_pdf():
+    stats = {}
+    out = doc_translator.translate_pdf_bytes_preserve_layout(
+        _make_pdf(),
+        "English",
+        "English",
+        fonts_dir=FONTS_DIR,
+        stats=stats,
+        translate_batch_fn=_fake_translate,
+    )
+
+    result = fitz.open(stream=out.read(), filetype="pdf")
+    assert len(result) == 2
+    text = result[0].get_text()
+    assert "translated 0" in text and "translated 2" in text
+    assert "first paragraph" not in text
+    assert stats["pages_recomputed"] == 2
+    assert sum(v for k, v in stats["placement"].items() if k.startswith("page_")) == 2
+    assert sum(v for k, v in stats["placement"].items() if k.startswith("block_")) == 6
+
+
+@pytest.mark.parametrize("uploads", [1, 2])
+def test_document_structure_survives(uploads):
+    # The second upload of the same PDF reuses every page from the page store
+    for _ in range(uploads):
+        stats = {}
+        out = doc_translator.translate_pdf_bytes_preserve_layout(
+            _make_pdf(pages=3, structure=True),
+            "English",
+            "English",
+            fonts_dir=FONTS_DIR,
+            stats=stats,
+            translate_batch_fn=_fake_translate,
+        )
+    assert stats["pages_reused"] == (3 if uploads == 2 else 0)
+
+    result = fitz.open(stream=out.read(), filetype="pdf")
+    links = result[0].get_links()
+    assert [(link["kind"], link["page"]) for link in links] == [(fitz.LINK_GOTO, 2)]
+    assert result[0].get_label() == "A-1"
+    assert result[2].get_label() == "A-3"
+    assert result.get_toc() == [[1, "Last page", 3]]
+    assert result.embfile_get("notes.txt") == b"attached"
+
+
+def _make_pdf_with_image(shade: int, rule: bool = False) -> bytes:
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Heading beside a picture", fontsize=16)
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 16, 16), False)
+    pix.set_rect(pix.irect, (shade, shade, shade))
+    page.insert_image(fitz.Rect(300, 300, 400, 400), pixmap=pix)
+    if rule:
+        page.draw_line((72, 450), (520, 450))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.mark.parametrize("change", [{"shade": 10}, {"rule": True}])
+def test_pages_with_other_images_or_drawings_are_recomputed(change):
+    revised = _make_pdf_with_image(**{"shade": 250, **change})
+    for pdf in (_make_pdf_with_image(250), revised):
+        stats = {}
+        out = doc_translator.translate_pdf_bytes_preserve_layout(
+            pdf,
+            "English",
+            "English",
+            fonts_dir=FONTS_DIR,
+            stats=stats,
+            translate_batch_fn=_fake_translate,
+        )
+    assert stats["pages_reused"] == 0
+
+    result = fitz.open(stream=out.read(), filetype="pdf")
+    pixel = result[0].get_pixmap(clip=fitz.Rect(340, 340, 360, 360)).pixel(5, 5)
+    assert pixel == fitz.open(stream=revised)[0].get_pixmap(
+        clip=fitz.Rect(340, 340, 360, 360)
+    ).pixel(5, 5)
+
+
+def test_pages_with_failed_blocks_are_not_stored():
+    def failing_translate(texts, src_lang, tgt_lang, glossary_obj=None):
+        return [bulk.TRANSLATION_ERROR] + _fake_translate(texts[1:], src_lang, tgt_lang)
+
+    stats = {}
+    doc_translator.translate_pdf_bytes_preserve_layout(
+        _make_pdf(),
+        "English",
+        "English",
+        fonts_dir=FONTS_DIR,
+        stats=stats,
+        translate_batch_fn=failing_translate,
+    )
+    assert stats["placement"]["translation_errors"] == 2
+    assert page_store.store.stats()["pages"] == 0
+
+    doc_translator.translate_pdf_bytes_preserve_layout(
+        _make_pdf(),
+        "English",
+        "English",
+        fonts_dir=FONTS_DIR,
+        stats=stats,
+        translate_batch_fn=_fake_translate,
+    )
+    assert stats["pages_reused"] == 0
+    assert page_store.store.stats()["pages"] == 2
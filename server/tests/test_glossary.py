@@ -0,0 +1,50 @@
+import pytest
+
+import glossary
+
+
+@pytest.fixture(autouse=True)
+def empty_glossary_store(monkeypatch):
+    monkeypatch.setattr(glossary, "store", glossary.GlossaryStore())
+
+
+def test_recreated_glossary_does_not_reuse_the_old_terms():
+    old = glossary.store.put("terms", "English", "Hindi", {"widget": "OLD"})
+    assert glossary.store.delete("terms")
+    assert glossary.store.get("terms") is None
+
+    new = glossary.store.put("terms", "English", "Hindi", {"widget": "NEW"})
+    assert new.cache_key != old.cache_key
+
+    protected, replacements = glossary.protect_terms(["a widget"], new)
+    assert protected == ["a <GLS0>"]
+    assert glossary.restore_terms(["ek <GLS0>"], replacements) == (["ek NEW"], [])
+
+
+def test_matches_overlapping_terms():
+    matcher = glossary.AhoCorasick(["he", "she", "his", "hers"])
+    assert sorted(matcher.iter_matches("ushers")) == [(1, 4, 1), (2, 4, 0), (2, 6, 3)]
+
+
+def test_oversized_glossary_is_rejected(monkeypatch):
+    monkeypatch.setattr(glossary, "GLOSSARY_MAX_TERMS", 2)
+    with pytest.raises(ValueError):
+        glossary.store.put("big", "English", "Hindi", {"a": "1", "b": "2", "c": "3"})
+    assert glossary.store.get("big") is None
+
+
+def test_compiled_cache_keeps_to_its_state_budget():
+    store = glossary.GlossaryStore(cache_size=8, cache_max_states=20)
+    first = store.put("first", "English", "Hindi", {"ten chars.": "x"})
+    second = store.put("second", "English", "Hindi", {"ten chars!": "y"})
+    assert first.cache_key not in store._compiled
+    assert second.cache_key in store._compiled
+
+
+def test_lost_placeholders_are_reported():
+    restored, lost = glossary.restore_terms(
+        ["ek <GLS0> aur <GLS1>", "sirf <GLS 0>", "<GLS0> <GLS7>"],
+        [["A", "B"], ["A", "B"], ["A"]],
+    )
+    assert restored == ["ek A aur B", "sirf A", "A <GLS7>"]
+    assert lost == [1, 2]
@@ -0,0 +1,509 @@
+# translate_cli.py
+"""
+Command-line corpus and document translator.
+
+Uses the same engine as the web servers (engine.translate_batch and
+doc_translator) without importing Flask or the audio stack. Work is split into
+units (chunks of lines, or one PDF each), translated by a pool of processes with
+batched generation, and checkpointed as each unit finishes, so an interrupted
+run resumes where it stopped. A unit that fails is recorded in the checkpoint
+and retried by the next run; --allow-failures writes the output without it.
+
+    python translate_cli.py corpus.txt -o corpus.hi.txt --tgt Hindi
+    python translate_cli.py catalog.jsonl -o catalog.out.jsonl --workers 4
+    python translate_cli.py contracts/ -o translated/ --src English --tgt Tamil
+
+Every worker process loads its own copy of the models.
+"""
+
+import argparse
+import functools
+import itertools
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import bulk
+import langid
+
+SERVER_DIR = Path(__file__).resolve().parent
+
+# Translation engine of this process, imported by _init_worker
+_engine_module = None
+
+
+def _init_worker(threads: int):
+    global _engine_module
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+    import engine
+    import logs
+
+    logs.setup()
+    _engine_module = engine
+
+
+def _engine():
+    if _engine_module is None:
+        _init_worker(0)
+    return _engine_module
+
+
+# ----------------------
+# Work units (run in worker processes)
+# ----------------------
+def _translate_lines_chunk(task):
+    """Translate the non-empty lines of a plain-text chunk, shortest first."""
+    idx, lines, src_lang, tgt_lang, batch_size = task
+    engine = _engine()
+    gen_stats = {}
+    out = list(lines)
+    todo = sorted(
+        (i for i, l in enumerate(lines) if l.strip()), key=lambda i: len(lines[i])
+    )
+    for start in range(0, len(todo), batch_size):
+        ids = todo[start : start + batch_size]
+        translated = engine.translate_batch(
+            [lines[i].strip() for i in ids], src_lang, tgt_lang, gen_stats=gen_stats
+        )
+        for i, t in zip(ids, translated):
+            out[i] = t
+    errors = sum(1 for i in todo if out[i] == bulk.TRANSLATION_ERROR)
+    return (
+        idx,
+        out,
+        {
+            "sentences": len(todo) - errors,
+            "tokens": gen_stats.get("output_tokens", 0),
+            "errors": errors,
+        },
+    )
+
+
+def _translate_jsonl_chunk(task):
+    """Translate a chunk of {id, text, src_lang, tgt_lang} JSONL records."""
+    idx, lines, first_line, src_lang, tgt_lang, batch_size = task
+    engine = _engine()
+    gen_stats = {}
+
+    def translate_fn(texts, src, tgt):
+        return engine.translate_batch(texts, src, tgt, gen_stats=gen_stats)
+
+    records = bulk.parse_ndjson(
+        lines,
+        src_lang,
+        tgt_lang,
+        engine.LANG_CODES,
+        first_line=first_line,
+        auto_lang=langid.AUTO,
+    )
+    results = list(
+        bulk.iter_bulk_translations(
+            records, translate_fn, batch_size=batch_size, max_buffered=len(lines) or 1
+        )
+    )
+    out = [json.dumps(r, ensure_ascii=False) for r in results]
+    sentences = sum(1 for r in results if "translation" in r)
+    errors = sum(1 for r in results if r.get("error") == bulk.TRANSLATION_FAILED)
+    return (
+        idx,
+        out,
+        {
+            "sentences": sentences,
+            "tokens": gen_stats.get("output_tokens", 0),
+            "errors": errors,
+        },
+    )
+
+
+def _translate_pdf_file(task):
+    """Translate one PDF into out_path (written atomically)."""
+    idx, in_path, out_path, src_lang, tgt_lang = task
+    engine = _engine()
+    import doc_translator
+
+    gen_stats = {}
+    page_stats = {}
+
+    def translate_batch_fn(texts, src, tgt, glossary_obj=None):
+        return engine.translate_batch(texts, src, tgt, glossary_obj, gen_stats)
+
+    buf = doc_translator.translate_pdf_bytes_preserve_layout(
+        Path(in_path).read_bytes(),
+        src_lang,
+        tgt_lang,
+        fonts_dir=str(SERVER_DIR / "fonts"),
+        stats=page_stats,
+        translate_batch_fn=translate_batch_fn,
+    )
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(buf.getvalue())
+    os.replace(tmp, out_path)
+    return (
+        idx,
+        None,
+        {
+            "tokens": gen_stats.get("output_tokens", 0),
+            "pages": page_stats.get("pages_total", 0),
+            "errors": page_stats.get("placement", {}).get("translation_errors", 0),
+        },
+    )
+
+
+def _guarded(fn, task):
+    """Run a unit, turning an exception into a failed result instead of ending the run."""
+    try:
+        return fn(task)
+    except Exception as e:
+        return task[0], None, {"errors": 1, "failure": f"{type(e).__name__}: {e}"}
+
+
+# ----------------------
+# Checkpointing
+# ----------------------
+class Checkpoint:
+    """
+    Completed unit keys, failed unit keys with the reason of their last failure,
+    and running totals, persisted as JSON after every unit. Failed units are
+    retried by the next run.
+    """
+
+    def __init__(self, path: Path, signature: Dict, restart: bool = False):
+        self.path = path
+        self.signature = signature
+        self.done = set()
+        self.failed: Dict = {}
+        self.totals = {"sentences": 0, "tokens": 0, "pages": 0, "seconds": 0.0}
+        if path.exists() and not restart:
+            data = json.loads(path.read_text())
+            if data.get("signature") != signature:
+                raise SystemExit(
+                    f"Checkpoint {path} was written for different settings; "
+                    "use --restart to discard it."
+                )
+            self.done = set(data.get("done", []))
+            self.failed = {key: reason for key, reason in data.get("failed", [])}
+            self.totals.update(data.get("totals", {}))
+
+    def mark(self, key, counts: Dict, seconds: float):
+        self.done.add(key)
+        self.failed.pop(key, None)
+        for k, v in counts.items():
+            if k == "errors":
+                continue
+            self.totals[k] = self.totals.get(k, 0) + v
+        self.totals["seconds"] += seconds
+        self.save()
+
+    def mark_failed(self, key, counts: Dict):
+        self.failed[key] = counts.get("failure") or (
+            f"{counts['errors']} failed translations"
+        )
+        self.save()
+
+    def save(self):
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(
+            json.dumps(
+                {
+                    "signature": self.signature,
+                    "done": sorted(self.done),
+                    "failed": sorted(self.failed.items()),
+                    "totals": self.totals,
+                }
+            )
+        )
+        os.replace(tmp, self.path)
+
+
+class Throughput:
+    """Rates for the work done in this run (resumed units are not counted)."""
+
+    def __init__(self, total_units: int, already_done: int):
+        self.t0 = time.perf_counter()
+        self.total_units = total_units
+        self.units = already_done
+        self.sentences = 0
+        self.tokens = 0
+        self.pages = 0
+
+    def add(self, counts: Dict):
+        self.units += 1
+        self.sentences += counts.get("sentences", 0)
+        self.tokens += counts.get("tokens", 0)
+        self.pages += counts.get("pages", 0)
+
+    def line(self) -> str:
+        elapsed = max(1e-9, time.perf_counter() - self.t0)
+        return (
+            f"{self.units}/{self.total_units} units | "
+            f"{self.sentences / elapsed:.1f} sentences/s | "
+            f"{self.tokens / elapsed:.1f} tokens/s | "
+            f"{self.pages * 60 / elapsed:.2f} pages/min"
+        )
+
+
+def _run(tasks: Iterator, fn, workers: int, threads: int, on_result):
+    fn = functools.partial(_guarded, fn)
+    if workers <= 1:
+        _init_worker(threads)
+        for task in tasks:
+            on_result(fn(task))
+        return
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(threads,)) as pool:
+        for result in pool.imap_unordered(fn, tasks):
+            on_result(result)
+
+
+# ----------------------
+# Modes
+# ----------------------
+def _count_lines(path: Path) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def _iter_line_chunks(path: Path, chunk_size: int) -> Iterator[List[str]]:
+    with open(path, encoding="utf-8") as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                return
+            yield lines
+
+
+def _translate_corpus(args, mode: str):
+    """Plain-text (one sentence per line) or JSONL corpus → single output file."""
+    in_path, out_path = args.input, args.output
+    parts_dir = out_path.with_name(out_path.name + ".parts")
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    ckpt = Checkpoint(
+        out_path.with_name(out_path.name + ".ckpt.json"),
+        {
+            "input": str(in_path),
+            "mode": mode,
+            "src_lang": args.src,
+            "tgt_lang": args.tgt,
+            "chunk_size": args.chunk_size,
+        },
+        args.restart,
+    )
+    n_chunks = -(-_count_lines(in_path) // args.chunk_size)
+    progress = Throughput(n_chunks, len(ckpt.done))
+
+    def tasks():
+        for idx, lines in enumerate(_iter_line_chunks(in_path, args.chunk_size)):
+            if idx in ckpt.done:
+                continue
+            if mode == "jsonl":
+                yield idx, lines, idx * args.chunk_size, args.src, args.tgt, args.batch_size
+            else:
+                lines = [l.rstrip("\r\n") for l in lines]
+                yield idx, lines, args.src, args.tgt, args.batch_size
+
+    last = [time.perf_counter()]
+    failed = []
+
+    def on_result(result):
+        idx, out_lines, counts = result
+        now = time.perf_counter()
+        if counts["errors"]:
+            # Not marked done, so the next run translates the chunk again
+            ckpt.mark_failed(idx, counts)
+            failed.append(idx)
+            last[0] = now
+            print(f"[CLI] chunk {idx} failed: {ckpt.failed[idx]}")
+            return
+        part = parts_dir / f"{idx:08d}"
+        tmp = part.with_suffix(".tmp")
+        tmp.write_text("".join(l + "\n" for l in out_lines), encoding="utf-8")
+        os.replace(tmp, part)
+        ckpt.mark(idx, counts, now - last[0])
+        last[0] = now
+        progress.add(counts)
+        print(f"[CLI] chunk {idx} done | {progress.line()}")
+
+    fn = _translate_jsonl_chunk if mode == "jsonl" else _translate_lines_chunk
+    _run(tasks(), fn, args.workers, args.threads, on_result)
+    if failed and not args.allow_failures:
+        return ckpt, progress, len(failed)
+
+    # Stitch the parts together in input order, leaving out failed chunks
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    with open(tmp, "wb") as out:
+        for idx in range(n_chunks):
+            if idx not in ckpt.done:
+                continue
+            with open(parts_dir / f"{idx:08d}", "rb") as part:
+                shutil.copyfileobj(part, out)
+    os.replace(tmp, out_path)
+    if not failed:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        ckpt.path.unlink(missing_ok=True)
+    # Otherwise the parts and checkpoint stay, so a later run can retry the
+    # failed chunks and stitch a complete output
+    return ckpt, progress, len(failed)
+
+
+def _translate_pdfs(args):
+    """A PDF file or a directory of PDFs → translated PDF(s)."""
+    if args.input.is_dir():
+        pdfs = sorted(p for p in args.input.iterdir() if p.suffix.lower() == ".pdf")
+        out_dir = args.output
+        out_dir.mkdir(parents=True, exist_ok=True)
+        targets = [out_dir / f"translated_{p.name}" for p in pdfs]
+        ckpt_path = out_dir / ".translate_cli.ckpt.json"
+    else:
+        pdfs = [args.input]
+        targets = [args.output]
+        ckpt_path = args.output.with_name(args.output.name + ".ckpt.json")
+    ckpt = Checkpoint(
+        ckpt_path,
+        {
+            "input": str(args.input),
+            "mode": "pdf",
+            "src_lang": args.src,
+            "tgt_lang": args.tgt,
+        },
+        args.restart,
+    )
+    progress = Throughput(len(pdfs), sum(1 for p in pdfs if p.name in ckpt.done))
+    tasks = [
+        (idx, str(p), str(t), args.src, args.tgt)
+        for idx, (p, t) in enumerate(zip(pdfs, targets))
+        if p.name not in ckpt.done
+    ]
+    last = [time.perf_counter()]
+    failed = []
+
+    def on_result(result):
+        idx, _, counts = result
+        now = time.perf_counter()
+        if counts["errors"]:
+            # Not marked done, so the next run translates the file again
+            ckpt.mark_failed(pdfs[idx].name, counts)
+            failed.append(idx)
+            last[0] = now
+            print(f"[CLI] {pdfs[idx].name} failed: {ckpt.failed[pdfs[idx].name]}")
+            return
+        ckpt.mark(pdfs[idx].name, counts, now - last[0])
+        last[0] = now
+        progress.add(counts)
+        print(f"[CLI] {pdfs[idx].name} done | {progress.line()}")
+
+    _run(iter(tasks), _translate_pdf_file, args.workers, args.threads, on_result)
+    return ckpt, progress, len(failed)
+
+
+def _detect_mode(path: Path, requested: Optional[str]) -> str:
+    if requested:
+        return requested
+    if path.is_dir() or path.suffix.lower() == ".pdf":
+        return "pdf"
+    if path.suffix.lower() in (".jsonl", ".ndjson"):
+        return "jsonl"
+    return "text"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Translate text corpora, JSONL records or PDFs without the web server."
+    )
+    parser.add_argument(
+        "input", type=Path, help="text file, JSONL file, PDF or directory of PDFs"
+    )
+    parser.add_argument(
+        "-o", "--output", type=Path, required=True, help="output file or directory"
+    )
+    parser.add_argument(
+        "--src",
+        default="English",
+        help='source language, or "auto" to detect it per text (default: English)',
+    )
+    parser.add_argument(
+        "--tgt", default="Hindi", help="target language (default: Hindi)"
+    )
+    parser.add_argument(
+        "--format", choices=["text", "jsonl", "pdf"], help="override input detection"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="translation processes (default: 1)"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="torch threads per worker (default: cores / workers)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=bulk.BULK_BATCH_SIZE,
+        help="texts per generate call",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=512, help="lines per checkpointed unit"
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore an existing checkpoint"
+    )
+    parser.add_argument(
+        "--allow-failures",
+        action="store_true",
+        help="write the output without the units that failed and exit 0",
+    )
+    args = parser.parse_args(argv)
+
+    args.input = args.input.resolve()
+    args.output = args.output.resolve()
+    if not args.input.exists():
+        parser.error(f"{args.input} does not exist")
+    if not args.threads:
+        args.threads = max(1, (os.cpu_count() or 1) // max(1, args.workers))
+    # Model and font paths are relative to the server directory
+    os.chdir(SERVER_DIR)
+
+    mode = _detect_mode(args.input, args.format)
+    if mode == "pdf":
+        ckpt, progress, failed = _translate_pdfs(args)
+    else:
+        ckpt, progress, failed = _translate_corpus(args, mode)
+
+    totals = ckpt.totals
+    seconds = max(1e-9, totals["seconds"])
+    print(f"[CLI] This run: {progress.line()}")
+    print(
+        f"[CLI] Overall: {totals['sentences']} sentences, {totals['tokens']} tokens, "
+        f"{totals['pages']} pages in {seconds:.1f}s | "
+        f"{totals['sentences'] / seconds:.1f} sentences/s | "
+        f"{totals['tokens'] / seconds:.1f} tokens/s | "
+        f"{totals['pages'] * 60 / seconds:.2f} pages/min"
+    )
+    if failed:
+        for key, reason in sorted(ckpt.failed.items()):
+            print(f"[CLI] Failed: {key}: {reason}")
+        if args.allow_failures:
+            print(
+                f"[CLI] {failed} units failed and were left out of the output; "
+                "run the same command again to retry them"
+            )
+            return 0
+        print(
+            f"[CLI] {failed} units failed and were not checkpointed; "
+            "run the same command again to retry them"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,468 @@
+# worker_pool.py
+import atexit
+import itertools
+import logging
+import math
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Dict, List, Optional
+
+# ----------------------
+# Configuration
+# ----------------------
+# Number of model-serving processes (0 = translate inline in the request thread)
+WORKER_POOL_SIZE = int(os.environ.get("WORKER_POOL_SIZE", "0"))
+# Cores pinned per worker (0 = split the available cores evenly)
+WORKER_CORES = int(os.environ.get("WORKER_CORES", "0"))
+# Intra-op threads per worker (0 = one per pinned core)
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", "0"))
+# Directions per worker, ";" between workers and "," within one worker,
+# e.g. "en_to_indic;indic_to_en;en_to_indic,indic_to_en". Empty = alternate.
+WORKER_DIRECTIONS = os.environ.get("WORKER_DIRECTIONS", "")
+# Seconds a caller waits for a batch before giving up
+WORKER_TIMEOUT = float(os.environ.get("WORKER_TIMEOUT", "600"))
+# Times a batch is resubmitted after the worker running it died
+WORKER_MAX_RETRIES = 1
+
+# Set in worker processes so they never start a pool of their own
+_IN_WORKER_ENV = "LE_WORKER_PROCESS"
+
+DIRECTIONS = ("en_to_indic", "indic_to_en")
+
+log = logging.getLogger("worker_pool")
+
+
+def _worker_main(worker_id, cores, n_threads, directions, task_q, cancel_q, result_q):
+    """
+    Entry point of a worker process: pin, load its directions and serve batches.
+    Job ids arriving on cancel_q stop that batch's generate(), or skip it if it
+    has not started yet.
+    """
+    os.environ[_IN_WORKER_ENV] = "1"
+    os.environ["OMP_NUM_THREADS"] = str(n_threads)
+    os.environ["MKL_NUM_THREADS"] = str(n_threads)
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+
+    torch.set_num_threads(n_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Already set (torch was imported with parallel work started)
+        pass
+
+    import admission
+    import engine
+    import logs
+
+    logs.setup()
+
+    # job_id -> token of the running batch; ids cancelled before they started
+    running: Dict[int, "admission.CancelToken"] = {}
+    cancelled = set()
+    cancel_lock = threading.Lock()
+
+    def _watch_cancellations():
+        while True:
+            job_id = cancel_q.get()
+            with cancel_lock:
+                token = running.get(job_id)
+                if token is not None:
+                    token.cancel("abandoned")
+                else:
+                    cancelled.add(job_id)
+
+    threading.Thread(target=_watch_cancellations, daemon=True).start()
+
+    for direction in directions:
+        engine.cache.load_translation_models(direction)
+    result_q.put(("ready", worker_id, None))
+
+    while True:
+        job = task_q.get()
+        if job is None:
+            break
+        job_id, texts, src_lang, tgt_lang, deadline, request_id = job
+        # Log records from this batch carry the originating request and pool job
+        logs.set_request_id(request_id)
+        logs.set_job_id(job_id)
+        # Wall-clock deadline of the request, so generate() stops with it
+        token = admission.CancelToken(
+            math.inf if deadline is None else time.monotonic() + deadline - time.time()
+        )
+        with cancel_lock:
+            skip = job_id in cancelled
+            # Jobs reach a worker in id order, so older cancellations are stale
+            cancelled.difference_update([i for i in cancelled if i <= job_id])
+            if not skip:
+                running[job_id] = token
+        if skip:
+            # The caller already gave up and forgot the job; no result is expected
+            log.debug("Skipping abandoned job %d", job_id)
+            continue
+        t0 = time.perf_counter()
+        gen_stats = {}
+        admission.set_token(token)
+        try:
+            out = engine.generate_batch(texts, src_lang, tgt_lang, gen_stats=gen_stats)
+            error = None
+        except admission.RequestCancelled as e:
+            out, error = None, ("cancelled", e.reason)
+        except Exception as e:
+            out, error = None, ("error", repr(e))
+        finally:
+            admission.set_token(None)
+            with cancel_lock:
+                running.pop(job_id, None)
+        result_q.put(
+            (
+                "done",
+                worker_id,
+                (
+                    job_id,
+                    out,
+                    error,
+                    time.perf_counter() - t0,
+                    gen_stats.get("output_tokens", 0),
+                ),
+            )
+        )
+
+
+class _Worker:
+    def __init__(self, worker_id: int, cores: List[int], directions: List[str]):
+        self.worker_id = worker_id
+        self.cores = cores
+        self.directions = directions
+        self.process = None
+        self.task_q = None
+        self.cancel_q = None
+        self.ready = False
+        self.started_at = 0.0
+        self.restarts = -1
+        # job_id -> weight (characters) of batches sent to this worker
+        self.inflight: Dict[int, int] = {}
+        self.busy_seconds = 0.0
+        self.jobs = 0
+        self.texts = 0
+        self.output_tokens = 0
+
+    @property
+    def load(self) -> int:
+        return sum(self.inflight.values())
+
+
+class WorkerPool:
+    """
+    Pool of CPU-pinned model-serving processes. Each worker owns its core set,
+    thread count and loaded direction(s); batches are routed to the least loaded
+    live worker serving their direction and dead workers are respawned.
+    """
+
+    def __init__(
+        self,
+        size: int = WORKER_POOL_SIZE,
+        cores_per_worker: int = WORKER_CORES,
+        threads: int = WORKER_THREADS,
+        directions: str = WORKER_DIRECTIONS,
+    ):
+        if size <= 0:
+            raise ValueError("WorkerPool size must be positive")
+        self._ctx = mp.get_context("spawn")
+        self._result_q = self._ctx.Queue()
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count()
+        # job_id -> [worker_id, payload, future, retries]
+        self._jobs: Dict[int, list] = {}
+        self._closed = False
+
+        available = (
+            sorted(os.sched_getaffinity(0))
+            if hasattr(os, "sched_getaffinity")
+            else list(range(os.cpu_count() or 1))
+        )
+        per_worker = cores_per_worker or max(1, len(available) // size)
+        per_worker_dirs = [
+            [d.strip() for d in spec.split(",") if d.strip()]
+            for spec in directions.split(";")
+            if spec.strip()
+        ]
+
+        self._workers: List[_Worker] = []
+        for i in range(size):
+            cores = available[i * per_worker : (i + 1) * per_worker] or available
+            if per_worker_dirs:
+                dirs = per_worker_dirs[i % len(per_worker_dirs)]
+            elif size == 1:
+                dirs = list(DIRECTIONS)
+            else:
+                dirs = [DIRECTIONS[i % len(DIRECTIONS)]]
+            for d in dirs:
+                if d not in DIRECTIONS:
+                    raise ValueError(f"Unknown worker direction: {d}")
+            self._workers.append(_Worker(i, cores, dirs))
+        self._threads = threads
+
+        served = {d for w in self._workers for d in w.directions}
+        for d in DIRECTIONS:
+            if d not in served:
+                log.warning("No worker serves %s; it will run inline", d)
+
+    # ------------- Lifecycle -------------
+    def start(self):
+        for worker in self._workers:
+            self._spawn(worker)
+        threading.Thread(target=self._collect_results, daemon=True).start()
+        threading.Thread(target=self._monitor, daemon=True).start()
+        log.info("Started %d translation workers", len(self._workers))
+
+    def _spawn(self, worker: _Worker):
+        n_threads = self._threads or len(worker.cores)
+        worker.task_q = self._ctx.Queue()
+        worker.cancel_q = self._ctx.Queue()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                worker.worker_id,
+                worker.cores,
+                n_threads,
+                worker.directions,
+                worker.task_q,
+                worker.cancel_q,
+                self._result_q,
+            ),
+            daemon=True,
+        )
+        worker.ready = False
+        worker.started_at = time.time()
+        worker.restarts += 1
+        worker.process.start()
+        log.info(
+            "Worker %d (pid %d) on cores %s with %d threads serving %s",
+            worker.worker_id,
+            worker.process.pid,
+            worker.cores,
+            n_threads,
+            worker.directions,
+        )
+
+    def shutdown(self):
+        self._closed = True
+        for worker in self._workers:
+            try:
+                worker.task_q.put(None)
+            except Exception:
+                pass
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+
+    # ------------- Dispatch -------------
+    def serves(self, direction: str) -> bool:
+        return any(direction in w.directions for w in self._workers)
+
+    def submit(
+        self,
+        texts: List[str],
+        src_lang,
+        tgt_lang,
+        direction: str,
+        deadline: Optional[float] = None,
+    ) -> Future:
+        """Queue a batch; deadline is a wall-clock time after which the worker stops generating."""
+        return self._submit(texts, src_lang, tgt_lang, direction, deadline)[1]
+
+    def _submit(self, texts, src_lang, tgt_lang, direction, deadline):
+        import logs
+
+        future = Future()
+        payload = (texts, src_lang, tgt_lang, deadline, logs.request_id())
+        with self._lock:
+            job_id = next(self._job_ids)
+            worker = self._pick_worker(direction)
+            self._jobs[job_id] = [worker.worker_id, payload, future, 0]
+            self._send(worker, job_id, payload)
+        return job_id, future
+
+    def _pick_worker(self, direction: str) -> _Worker:
+        candidates = [w for w in self._workers if direction in w.directions]
+        # Prefer workers that finished loading, then the smallest queued load
+        return min(candidates, key=lambda w: (not w.ready, w.load, w.worker_id))
+
+    def _send(self, worker: _Worker, job_id: int, payload):
+        texts = payload[0]
+        worker.inflight[job_id] = sum(len(t) for t in texts) or 1
+        worker.task_q.put((job_id,) + payload)
+
+    def translate(
+        self,
+        texts: List[str],
+        src_lang,
+        tgt_lang,
+        direction: str,
+        gen_stats: Optional[Dict] = None,
+    ) -> List[str]:
+        import admission
+
+        token = admission.current_token()
+        deadline = None
+        if token is not None:
+            deadline = time.time() + token.remaining()
+        job_id, future = self._submit(texts, src_lang, tgt_lang, direction, deadline)
+        # Wait in short slices so a cancelled request stops waiting promptly
+        waited = 0.0
+        try:
+            while True:
+                try:
+                    out, tokens = future.result(timeout=0.25)
+                    break
+                except FutureTimeout:
+                    waited += 0.25
+                    if token is not None:
+                        token.raise_if_cancelled()
+                    if waited >= WORKER_TIMEOUT:
+                        raise
+        finally:
+            # No-op once the result arrived; otherwise stop tracking the job
+            self._abandon(job_id)
+        if gen_stats is not None:
+            gen_stats["output_tokens"] = gen_stats.get("output_tokens", 0) + tokens
+        return out
+
+    def _abandon(self, job_id: int):
+        """
+        Forget a job nobody waits for, so it stops counting towards its worker's
+        load, and tell the worker to stop or skip it.
+        """
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is not None:
+                worker = self._workers[job[0]]
+                worker.inflight.pop(job_id, None)
+                worker.cancel_q.put(job_id)
+
+    # ------------- Background threads -------------
+    def _collect_results(self):
+        while not self._closed:
+            try:
+                kind, worker_id, body = self._result_q.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            worker = self._workers[worker_id]
+            if kind == "ready":
+                worker.ready = True
+                log.info("Worker %d ready", worker_id)
+                continue
+
+            job_id, out, error, busy, tokens = body
+            with self._lock:
+                worker.inflight.pop(job_id, None)
+                worker.busy_seconds += busy
+                worker.jobs += 1
+                job = self._jobs.pop(job_id, None)
+                if job is not None:
+                    worker.texts += len(job[1][0])
+                worker.output_tokens += tokens
+            if job is None:
+                continue
+            if error is not None:
+                error_kind, detail = error
+                if error_kind == "cancelled":
+                    import admission
+
+                    job[2].set_exception(admission.RequestCancelled(detail))
+                else:
+                    job[2].set_exception(RuntimeError(f"worker {worker_id}: {detail}"))
+            else:
+                job[2].set_result((out, tokens))
+
+    def _monitor(self):
+        while not self._closed:
+            time.sleep(1.0)
+            for worker in self._workers:
+                if self._closed or worker.process.is_alive():
+                    continue
+                log.warning(
+                    "Worker %d died (exit code %s); respawning",
+                    worker.worker_id,
+                    worker.process.exitcode,
+                )
+                with self._lock:
+                    lost = list(worker.inflight)
+                    worker.inflight.clear()
+                    self._spawn(worker)
+                    for job_id in lost:
+                        job = self._jobs.get(job_id)
+                        if job is None:
+                            continue
+                        if job[3] >= WORKER_MAX_RETRIES:
+                            self._jobs.pop(job_id)
+                            job[2].set_exception(
+                                RuntimeError(
+                                    f"worker {worker.worker_id} died while translating"
+                                )
+                            )
+                            continue
+                        job[3] += 1
+                        self._send(worker, job_id, job[1])
+
+    # ------------- Reporting -------------
+    def stats(self) -> List[Dict]:
+        now = time.time()
+        out = []
+        with self._lock:
+            for w in self._workers:
+                uptime = max(1e-6, now - w.started_at)
+                out.append(
+                    {
+                        "worker_id": w.worker_id,
+                        "pid": w.process.pid if w.process else None,
+                        "alive": bool(w.process and w.process.is_alive()),
+                        "ready": w.ready,
+                        "cores": w.cores,
+                        "directions": w.directions,
+                        "restarts": w.restarts,
+                        "inflight_batches": len(w.inflight),
+                        "jobs": w.jobs,
+                        "texts": w.texts,
+                        "output_tokens": w.output_tokens,
+                        "busy_seconds": round(w.busy_seconds, 3),
+                        "utilization": round(min(1.0, w.busy_seconds / uptime), 4),
+                        "tokens_per_sec": (
+                            round(w.output_tokens / w.busy_seconds, 2)
+                            if w.busy_seconds
+                            else 0.0
+                        ),
+                    }
+                )
+        return out
+
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[WorkerPool]:
+    """Return the process-wide pool, starting it on first use; None if disabled."""
+    global _pool
+    if WORKER_POOL_SIZE <= 0 or os.environ.get(_IN_WORKER_ENV) == "1":
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = WorkerPool()
+                pool.start()
+                atexit.register(pool.shutdown)
+                _pool = pool
+    return _pool